@@ -0,0 +1,8 @@
+"""\
+# Benchmarks
+
+性能测试脚本, 在仓库根目录下用 `python -m benchmarks.xxx` 运行.
+
+benchmarks.workloads 是可以按规模生成的合成源文件, benchmarks.run 分阶段统计它们的耗时并输出 JSON,
+用于比较改动前后的性能; 其余的脚本各自针对某一项优化.
+"""
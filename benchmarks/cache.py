@@ -0,0 +1,64 @@
+"""\
+# Definition cache
+
+用 benchmarks.conversion 生成的证明文件, 分别统计第一次检查 (写入缓存), 第二次检查 (全部从缓存读取)
+和只修改最后一个定义之后再检查所花的时间, 以及缓存文件的大小. 最后在开头的定义中引入一个类型错误,
+再把它改正, 确认检查失败时缓存中其他定义的条目都还在, 改正之后只需要重新检查这一个定义.
+
+    python -m benchmarks.cache [N]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import benchmarks.conversion as conversion
+import lyzh.cache as cache
+import lyzh.concrete.elab as elab
+import lyzh.driver as driver
+
+
+def run(name: str, path: str, src: str) -> driver.Driver:
+    d = driver.Driver(store=cache.Store(path))
+    start = time.perf_counter()
+    d.check(src)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name}: {elapsed:.3f}s, "
+        f"{len(d.rechecked)} rechecked, {len(d.loaded)} loaded from cache"
+    )
+    return d
+
+
+def broken(path: str, src: str):
+    """检查一个开头的定义有类型错误的文件, 它之后的定义都不会被检查到."""
+    d = driver.Driver(store=cache.Store(path))
+    try:
+        d.check(src)
+    except elab.Error as e:
+        print(f"broken: {e}, {len(cache.Store(path).entries)} entries in cache")
+        return
+    raise AssertionError("expected a type error")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    src = conversion.generate(n)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.bin")
+        run("cold", path, src)
+        run("warm", path, src)
+        run("last changed", path, src + "\nfn extra -> type { type }\n")
+        size = os.path.getsize(path)
+        print(f"cache size: {size} bytes for {len(src.encode())} bytes of source")
+
+        early = "fn early -> type {{ {} }}\n\n"
+        run("with early", path, early.format("type") + src)
+        broken(path, early.format("|x| { x }") + src)
+        d = run("fixed", path, early.format("(t: type) -> t") + src)
+        assert d.rechecked == ["early"], d.rechecked
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""\
+# Conversion checking
+
+生成一个大量使用 Leibniz equality 的证明文件, 统计检查所有定义所花的时间, 以及其中相等检查所花的时间.
+
+    python -m benchmarks.conversion [N]
+"""
+
+import sys
+import time
+
+import lyzh.concrete.elab as elab
+import lyzh.concrete.resolve as resolve
+import lyzh.surface.grammar as grammar
+import lyzh.surface.parsec as parsec
+
+PRELUDE = """\
+fn eq(t: type) (a: t) (b: t) -> type {
+    (p: (v: t) -> type) -> (pa: p a) -> p b
+}
+
+fn refl(t: type) (a: t) -> ((eq t) a) a {
+    |p| { |pa| { pa } }
+}
+
+fn sym(t: type) (a: t) (b: t) (p: ((eq t) a) b) -> ((eq t) b) a {
+    (p (|b| { ((eq t) b) a })) ((refl t) a)
+}
+
+fn a -> type { type }
+
+fn b -> type { type }
+
+fn ab0 -> ((eq type) a) b { (refl type) a }
+
+fn nat -> type {
+    (t : type) -> (s: (n: t) -> t) -> (z: t) -> t
+}
+
+fn mul(a: nat) (b: nat) -> nat {
+    |t| { |s| { |z| { ((a t) ((b t) s)) z } } }
+}
+
+fn three -> nat {
+    |t| { |s| { |z| { s (s (s z)) } } }
+}
+
+fn nine -> nat { (mul three) three }
+"""
+
+
+def generate(n: int) -> str:
+    """生成 n 组来回使用 sym 的证明, 以及 n 个关于较大的 Church numeral 的证明."""
+    ds = [PRELUDE]
+    for i in range(1, n + 1):
+        ds.append(
+            f"fn ba{i} -> ((eq type) b) a {{ (((sym type) a) b) ab{i - 1} }}\n\n"
+            f"fn ab{i} -> ((eq type) a) b {{ (((sym type) b) a) ba{i} }}\n"
+        )
+    for i in range(1, n + 1):
+        ds.append(
+            f"fn big{i} -> nat {{ (mul nine) nine }}\n\n"
+            f"fn refl{i} -> ((eq nat) big{i}) big{i} {{ (refl nat) big{i} }}\n"
+        )
+    return "\n".join(ds)
+
+
+class _Elaborator(elab.Elaborator):
+    """额外统计相等检查所花时间的类型检查器."""
+
+    unify_time = 0.0
+
+    def unify(self, lhs, rhs):
+        start = time.perf_counter()
+        try:
+            return super().unify(lhs, rhs)
+        finally:
+            self.unify_time += time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    defs = []
+    grammar.prog(defs)(parsec.Source(generate(n)))
+    defs = resolve.Resolver().resolve(defs)
+    e = _Elaborator()
+    start = time.perf_counter()
+    e.elaborate(defs)
+    total = time.perf_counter() - start
+    print(f"{len(defs)} definitions: {total:.3f}s, unify: {e.unify_time:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
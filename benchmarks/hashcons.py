@@ -0,0 +1,36 @@
+"""\
+# Hash consing
+
+统计检查一个文件时分配的 ast.Term 节点数量, 对比普通工厂和 hash consing 工厂.
+
+    python -m benchmarks.hashcons FILE
+"""
+
+import sys
+
+import lyzh.abstract.data as ast
+import lyzh.concrete.elab as elab
+import lyzh.concrete.resolve as resolve
+import lyzh.surface.grammar as grammar
+import lyzh.surface.parsec as parsec
+
+
+def run(src: str, mk: ast.Builder) -> ast.Builder:
+    defs = []
+    grammar.prog(defs)(parsec.Source(src))
+    elab.Elaborator(mk=mk).elaborate(resolve.Resolver().resolve(defs))
+    return mk
+
+
+def main():
+    _, file, *_ = sys.argv
+    with open(file) as f:
+        src = f.read()
+    plain = run(src, ast.Builder())
+    shared = run(src, ast.HashCons())
+    print(f"plain:    {plain.count} nodes")
+    print(f"hashcons: {shared.count} nodes ({shared.hits} hits)")
+
+
+if __name__ == "__main__":
+    main()
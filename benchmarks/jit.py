@@ -0,0 +1,73 @@
+"""\
+# Closure compilation
+
+比较解释执行和编译 (见 lyzh.abstract.jit) 全局定义时的求值速度. 先检查 benchmarks.machine 中的序言,
+再对 `(mul a) b` 这样的值反复求 normal form, 其中 a 和 b 取遍 1 到 N 的 Church numeral, 所以 mul 和
+add 会被调用很多次. 每种方式都运行几次, 取最快的一次, 并确认两者的结果完全一致.
+
+    python -m benchmarks.jit [N] [REPEAT] [BACKEND]
+
+编译只有在定义被调用足够多次之后才划算: N 很小 (例如 5) 时求值本身只要几十毫秒, 和编译的开销差不多;
+默认的 N = 20 则要调用上万次 mul 和 add, 编译之后明显更快. 抽象机 (machine 和 need) 不使用编译的
+结果, 也就不会编译, 两种方式的时间应该相同.
+"""
+
+import sys
+import time
+import typing
+
+import benchmarks.machine as machine
+import lyzh.abstract.data as ast
+import lyzh.concrete.elab as elab
+import lyzh.concrete.resolve as resolve
+import lyzh.surface.parser as parser
+
+
+def numeral(n: int) -> str:
+    return "|t| { |s| { |z| { " + "s (" * n + "z" + ")" * n + " } } }"
+
+
+def generate(n: int) -> str:
+    ds = [machine.PRELUDE]
+    for i in range(1, n + 1):
+        ds.append(f"fn n{i} -> nat {{ {numeral(i)} }}\n")
+    return "\n".join(ds)
+
+
+def run(
+    src: str, jit: bool, n: int, backend: str
+) -> typing.Tuple[float, typing.List[str]]:
+    """检查 src, 然后对所有的 (mul a) b 和 (add a) b 求 normal form, 返回后者所花的时间和结果."""
+    e = elab.Elaborator(backend=backend, jit=jit)
+    names = {}
+    for d in e.elaborate(resolve.Resolver().resolve(parser.prog(src))):
+        names[d.name.text] = d.name
+    start = time.perf_counter()
+    out = []
+    for f in ("mul", "add"):
+        for a in range(1, n + 1):
+            for b in range(1, n + 1):
+                tm = ast.App(
+                    ast.App(ast.Ref(names[f]), ast.Ref(names[f"n{a}"])),
+                    ast.Ref(names[f"n{b}"]),
+                )
+                out.append(str(e.nf(tm)))
+    return time.perf_counter() - start, out
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    backend = sys.argv[3] if len(sys.argv) > 3 else "nbe"
+    src = generate(n)
+    results = {}
+    for jit in (False, True):
+        runs = [run(src, jit, n, backend) for _ in range(repeat)]
+        results[jit] = runs[0][1]
+        best = min(t for t, _ in runs)
+        print(f"{'compiled' if jit else 'interpreted':<12} {best:.3f}s")
+    assert results[False] == results[True], "results differ"
+
+
+if __name__ == "__main__":
+    main()
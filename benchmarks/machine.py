@@ -0,0 +1,75 @@
+"""\
+# Abstract machine
+
+用 mul 算出一串越来越大的 Church numeral, 每个都和 add 的结果比较, 分别用 lyzh.concrete.elab.BACKENDS
+中的每个求值器 (默认的求值器, CEK 抽象机和 call-by-need 的抽象机) 检查, 统计所花的时间, 并确认它们的
+结果完全一致.
+
+    python -m benchmarks.machine [N]
+"""
+
+import sys
+import time
+
+import lyzh.concrete.elab as elab
+import lyzh.driver as driver
+
+PRELUDE = """\
+fn nat -> type {
+    (t : type) -> (s: (n: t) -> t) -> (z: t) -> t
+}
+
+fn add(a: nat) (b: nat) -> nat {
+    |t| { |s| { |z| { ((a t) s) (((b t) s) z) } } }
+}
+
+fn mul(a: nat) (b: nat) -> nat {
+    |t| { |s| { |z| { ((a t) ((b t) s)) z } } }
+}
+
+fn eq(t: type) (a: t) (b: t) -> type {
+    (p: (v: t) -> type) -> (pa: p a) -> p b
+}
+
+fn refl(t: type) (a: t) -> ((eq t) a) a {
+    |p| { |pa| { pa } }
+}
+
+fn two -> nat { |t| { |s| { |z| { s (s z) } } } }
+
+fn three -> nat { |t| { |s| { |z| { s (s (s z)) } } } }
+
+fn m0 -> nat { three }
+"""
+
+
+def generate(n: int) -> str:
+    """m(i) = m(i - 1) * 3, 以及 2 * m(i) = m(i) + m(i) 的证明, 直到 m(n)."""
+    ds = [PRELUDE]
+    for i in range(1, n + 1):
+        ds.append(
+            f"fn m{i} -> nat {{ (mul m{i - 1}) three }}\n\n"
+            f"fn p{i} -> ((eq nat) ((mul two) m{i})) ((add m{i}) m{i}) {{\n"
+            f"    (refl nat) ((add m{i}) m{i})\n"
+            f"}}\n"
+        )
+    return "\n".join(ds)
+
+
+def run(backend: str, src: str) -> str:
+    d = driver.Driver(elab.Elaborator(backend=backend))
+    start = time.perf_counter()
+    out = "\n\n".join(str(x) for x in d.check(src))
+    print(f"{backend:<8} {time.perf_counter() - start:.3f}s")
+    return out
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    src = generate(n)
+    results = [run(backend, src) for backend in elab.BACKENDS]
+    assert all(r == results[0] for r in results), "backends disagree"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""\
+# Node memory
+
+统计每种节点的一个实例平均占用的字节数 (不包括子节点, 子节点都是共用的), 以及检查 benchmarks.workloads
+中几个文件时内存占用的峰值, 和检查结束后仍然被 Driver 持有的内存. 都用 tracemalloc 统计, 所以包括了
+实例的 __dict__ (如果有).
+
+    python -m benchmarks.memory [SCALE]
+
+SCALE 会乘上每个 workload 的默认规模, 默认是 0.2.
+"""
+
+import sys
+import tracemalloc
+import typing
+
+import benchmarks.workloads as workloads
+import lyzh.abstract.data as ast
+import lyzh.abstract.value as val
+import lyzh.concrete.data as cst
+import lyzh.core as core
+import lyzh.driver as driver
+
+_N = 10000
+
+_V = core.Var("x", 1)
+_TM = ast.Univ()
+_E = cst.Univ(0)
+_VAL = val.Univ()
+
+# 每种节点的名字和构造它的函数.
+_NODES: typing.List[typing.Tuple[str, typing.Callable[[], typing.Any]]] = [
+    ("core.Var", lambda: core.Var("x", 1)),
+    ("core.Param", lambda: core.Param(_V, _TM)),
+    ("cst.App", lambda: cst.App(0, _E, _E)),
+    ("cst.Resolved", lambda: cst.Resolved(0, _V)),
+    ("ast.Idx", lambda: ast.Idx(0, _V)),
+    ("ast.Ref", lambda: ast.Ref(_V)),
+    ("ast.App", lambda: ast.App(_TM, _TM)),
+    ("ast.Fn", lambda: ast.Fn(core.Param(_V, _TM), _TM)),
+    ("val.Neutral", lambda: val.Neutral(0, _V)),
+    ("val.Fn", lambda: val.Fn(core.Param(_V, _VAL), val.Closure((), _TM))),
+]
+
+
+def per_node(mk: typing.Callable[[], typing.Any]) -> float:
+    """一个实例平均占用的字节数, ast.Fn 和 val.Fn 包括了它们的参数和闭包."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    keep = [mk() for _ in range(_N)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # 减去列表本身.
+    return (after - before - sys.getsizeof(keep)) / len(keep)
+
+
+def check(src: str) -> typing.Tuple[int, int, int]:
+    """检查 src, 返回内存占用的峰值, 检查结束后 Driver 持有的内存, 以及分配的 ast.Term 节点数量."""
+    tracemalloc.start()
+    d = driver.Driver()
+    d.check(src)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, current, d.elaborator.mk.count
+
+
+def main():
+    scale = float(sys.argv[1]) if len(sys.argv) > 1 else 0.2
+    for name, mk in _NODES:
+        print(f"{name:<16}{per_node(mk):>8.1f} bytes")
+    print()
+    for name, size in workloads.SIZES.items():
+        n = max(1, int(size * scale))
+        peak, current, count = check(workloads.WORKLOADS[name](n))
+        print(
+            f"{name:<10} n={n:<6} peak {peak / 2**20:>8.2f} MiB, "
+            f"retained {current / 2**20:>8.2f} MiB, {count} nodes"
+        )
+
+
+if __name__ == "__main__":
+    main()
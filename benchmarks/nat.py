@@ -0,0 +1,62 @@
+"""\
+# Built-in naturals
+
+比较 Church numeral 和内置的自然数 (见 lyzh.abstract.data.PRIMS). 两者检查同样的一串定义: 用乘法算出
+越来越大的数, 并证明 2 * m = m + m. Church numeral 的版本就是 benchmarks.machine 中的, 它的大小随着
+数值指数增长, 所以 N 稍大一点就算不动了; 内置的版本则直接用 Python 的整数计算, N 可以大得多.
+
+    python -m benchmarks.nat [N] [BIG_N]
+
+N 是两者共同的规模, 默认是 6; BIG_N 是只跑内置版本的规模, 默认是 2000.
+"""
+
+import sys
+import time
+
+import benchmarks.machine as machine
+import lyzh.driver as driver
+
+PRELUDE = """\
+fn eq(t: type) (a: t) (b: t) -> type {
+    (p: (v: t) -> type) -> (pa: p a) -> p b
+}
+
+fn refl(t: type) (a: t) -> ((eq t) a) a {
+    |p| { |pa| { pa } }
+}
+
+fn m0 -> Nat { 3 }
+"""
+
+
+def generate(n: int) -> str:
+    """和 benchmarks.machine.generate 相同的定义, 但使用内置的自然数."""
+    ds = [PRELUDE]
+    for i in range(1, n + 1):
+        ds.append(
+            f"fn m{i} -> Nat {{ (Mul m{i - 1}) 3 }}\n\n"
+            f"fn p{i} -> ((eq Nat) ((Mul 2) m{i})) ((Add m{i}) m{i}) {{\n"
+            f"    (refl Nat) ((Add m{i}) m{i})\n"
+            f"}}\n"
+        )
+    return "\n".join(ds)
+
+
+def run(name: str, src: str) -> float:
+    start = time.perf_counter()
+    driver.Driver().check(src)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<16} {elapsed:.3f}s")
+    return elapsed
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    big = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    run(f"church n={n}", machine.generate(n))
+    run(f"builtin n={n}", generate(n))
+    run(f"builtin n={big}", generate(big))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""\
+# Parallel elaboration
+
+生成一个 "很宽" 的证明文件: 所有证明只依赖开头的一小段定义, 彼此之间互不依赖, 每个证明都要把两个较大的
+Church numeral 算出来比较. 分别统计用不同进程数检查所花的时间, 并确认结果和逐个检查完全一致.
+
+    python -m benchmarks.parallel [N] [JOBS...]
+"""
+
+import os
+import sys
+import time
+
+import lyzh.driver as driver
+
+PRELUDE = """\
+fn nat -> type {
+    (t : type) -> (s: (n: t) -> t) -> (z: t) -> t
+}
+
+fn mul(a: nat) (b: nat) -> nat {
+    |t| { |s| { |z| { ((a t) ((b t) s)) z } } }
+}
+
+fn eq(t: type) (a: t) (b: t) -> type {
+    (p: (v: t) -> type) -> (pa: p a) -> p b
+}
+
+fn refl(t: type) (a: t) -> ((eq t) a) a {
+    |p| { |pa| { pa } }
+}
+
+fn two -> nat { |t| { |s| { |z| { s (s z) } } } }
+
+fn three -> nat { |t| { |s| { |z| { s (s (s z)) } } } }
+
+fn ten -> nat { |t| { |s| { |z| { s (s (s (s (s (s (s (s (s (s z))))))))) } } } }
+
+fn hundred -> nat { (mul ten) ten }
+"""
+
+
+def generate(n: int) -> str:
+    """生成 n 个互相独立的证明, 每个都要比较两个值为 600 的 Church numeral."""
+    ds = [PRELUDE]
+    for i in range(n):
+        ds.append(
+            f"fn lhs{i} -> nat {{ (mul ((mul two) three)) hundred }}\n\n"
+            f"fn comm{i} -> ((eq nat) lhs{i}) ((mul hundred) ((mul three) two)) "
+            f"{{ (refl nat) lhs{i} }}\n"
+        )
+    return "\n".join(ds)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    jobs = [int(j) for j in sys.argv[2:]] or [1, 2, 4, os.cpu_count() or 1]
+    src = generate(n)
+    expected = None
+    base = 0.0
+    for j in jobs:
+        d = driver.Driver(jobs=j)
+        start = time.perf_counter()
+        try:
+            out = "\n\n".join(str(x) for x in d.check(src))
+        finally:
+            d.close()
+        elapsed = time.perf_counter() - start
+        if expected is None:
+            expected, base = out, elapsed
+        same = "same output" if out == expected else "DIFFERENT OUTPUT"
+        print(f"-j {j}: {elapsed:.3f}s, {base / elapsed:.2f}x, {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""\
+# Nested parentheses
+
+统计解析深层嵌套括号表达式所花的时间, 对比 lyzh.surface.grammar 的普通模式和 packrat 模式, 以及
+lyzh.surface.parser.
+
+    python -m benchmarks.parens [DEPTH...]
+"""
+
+import sys
+import time
+
+import lyzh.surface.grammar as grammar
+import lyzh.surface.parsec as parsec
+import lyzh.surface.parser as parser
+
+
+def generate(depth: int) -> str:
+    """生成形如 `((((eq t) a) a))` 的表达式, 外面再套上 depth 层括号. 每套一层括号, 普通模式下
+    fn_type, app 和 paren_expr 都会重新解析一遍括号里的内容, 所以解析时间会翻倍."""
+    e = "((eq t) a) a"
+    for _ in range(depth):
+        e = f"({e})"
+    return f"fn g(eq: type) (t: type) (a: type) -> type {{ {e} }}\n"
+
+
+def measure(name: str, f, src: str):
+    start = time.perf_counter()
+    f(src)
+    print(f"  {name}: {time.perf_counter() - start:.4f}s")
+
+
+def main():
+    depths = [int(d) for d in sys.argv[1:]] or [4, 8, 12, 16]
+    for depth in depths:
+        src = generate(depth)
+        print(f"depth {depth}:")
+        measure("combinator", lambda s: grammar.prog([])(parsec.Source(s)), src)
+        measure(
+            "packrat",
+            lambda s: grammar.prog([])(parsec.Source(s, memo=parsec.Memo())),
+            src,
+        )
+        measure("recursive descent", parser.prog, src)
+
+
+if __name__ == "__main__":
+    main()
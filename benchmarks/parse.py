@@ -0,0 +1,58 @@
+"""\
+# Parsing throughput
+
+生成一个较大的源文件, 分别统计 lyzh.surface.grammar (解析器组合子) 和 lyzh.surface.parser
+(token 序列 + 递归下降) 的解析速度, 单位是 MB/s.
+
+    python -m benchmarks.parse [N]
+"""
+
+import sys
+import time
+
+import lyzh.surface.grammar as grammar
+import lyzh.surface.parsec as parsec
+import lyzh.surface.parser as parser
+
+TEMPLATE = """\
+fn nat{i} -> type {{
+    (t : type) -> (s: (n: t) -> t) -> (z: t) -> t
+}}
+
+fn add{i}(a: nat{i}) (b: nat{i}) -> nat{i} {{
+    |t| {{ |s| {{ |z| {{ ((a t) s) (((b t) s) z) }} }} }}
+}}
+
+fn eq{i}(t: type) (a: t) (b: t) -> type {{
+    (p: (v: t) -> type) -> (pa: p a) -> p b
+}}
+
+"""
+
+
+def generate(n: int) -> str:
+    """生成 n 组定义."""
+    return "".join(TEMPLATE.format(i=i) for i in range(n))
+
+
+def combinator(src: str):
+    grammar.prog([])(parsec.Source(src))
+
+
+def measure(name: str, f, src: str):
+    start = time.perf_counter()
+    f(src)
+    elapsed = time.perf_counter() - start
+    mb = len(src.encode()) / 1024 / 1024
+    print(f"{name}: {mb:.2f} MB in {elapsed:.3f}s, {mb / elapsed:.2f} MB/s")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    src = generate(n)
+    measure("combinator", combinator, src)
+    measure("recursive descent", parser.prog, src)
+
+
+if __name__ == "__main__":
+    main()
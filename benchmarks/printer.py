@@ -0,0 +1,61 @@
+"""\
+# Printer
+
+比较拼出整个字符串再打印 (即 `"\\n\\n".join(str(d) ...)`) 和 lyzh.printer 直接写到流中的速度和内存峰值,
+以及 JSON 输出在普通工厂和 hash consing 工厂下的大小. 检查的是 benchmarks.machine 中的定义, 它的
+normal form 是很大的 Church numeral.
+
+    python -m benchmarks.printer [N]
+"""
+
+import io
+import sys
+import time
+import tracemalloc
+import typing
+
+import benchmarks.machine as machine
+import lyzh.abstract.data as ast
+import lyzh.concrete.elab as elab
+import lyzh.core as core
+import lyzh.driver as driver
+import lyzh.printer as printer
+
+
+def measure(name: str, f: typing.Callable[[], typing.Any]):
+    tracemalloc.start()
+    start = time.perf_counter()
+    f()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{name:<16} {elapsed:>8.3f}s, peak {peak / 2**20:>8.2f} MiB")
+
+
+def joined(ds: core.Defs[ast.Term], out: typing.TextIO):
+    out.write("\n\n".join(str(d) for d in ds) + "\n")
+
+
+def streamed(ds: core.Defs[ast.Term], out: typing.TextIO, **kwargs):
+    p = printer.Printer(out, **kwargs)
+    for d in ds:
+        p.defn(d)
+    p.finish()
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    src = machine.generate(n)
+    ds = driver.Driver().check(src)
+    with open("/dev/null", "w") as null:
+        measure("joined", lambda: joined(ds, null))
+        measure("streamed", lambda: streamed(ds, null))
+        measure("max_size=1000", lambda: streamed(ds, null, max_size=1000))
+    for mk in (ast.Builder(), ast.HashCons()):
+        out = io.StringIO()
+        streamed(driver.Driver(elab.Elaborator(mk=mk)).check(src), out, json=True)
+        print(f"json {type(mk).__name__:<11} {len(out.getvalue()) / 2**20:>8.2f} MiB")
+
+
+if __name__ == "__main__":
+    main()
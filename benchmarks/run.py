@@ -0,0 +1,117 @@
+"""\
+# Benchmark runner
+
+用 benchmarks.workloads 生成源文件, 分别统计解析, 作用域检查, 类型检查和打印所花的时间, 每个阶段取多次
+运行中最快的一次. 检查和命令行一样经过 lyzh.driver.Driver (不使用磁盘缓存), 各阶段的时间就是它统计的
+时间 (见 lyzh.stats); 打印也和命令行一样使用 lyzh.printer.Printer, 只是写到内存中. 结果写成 JSON, 之后
+可以用 --compare 和另一次运行的结果对比.
+
+    python -m benchmarks.run [WORKLOAD[=N]...] [--repeat R] [--out FILE] [--compare FILE]
+"""
+
+import argparse
+import io
+import json
+import platform
+import sys
+import time
+import typing
+
+import benchmarks.workloads as workloads
+import lyzh.driver as driver
+import lyzh.printer as printer
+import lyzh.stats as stats
+
+PHASES = ["parse", "resolve", "elaborate", "print"]
+
+
+def measure(src: str) -> typing.Dict[str, float]:
+    """运行一次完整的检查, 返回每个阶段所花的秒数."""
+    s = stats.Stats()
+    d = driver.Driver(keep=False, stats=s)
+    checked = d.check(src)
+    with s.phase("print"):
+        p = printer.Printer(io.StringIO())
+        for c in checked:
+            p.defn(c)
+        p.finish()
+    return {phase: s.phases.get(phase, 0.0) for phase in PHASES}
+
+
+def run(name: str, n: int, repeat: int) -> typing.Dict[str, typing.Any]:
+    src = workloads.WORKLOADS[name](n)
+    best = {phase: float("inf") for phase in PHASES}
+    for _ in range(repeat):
+        for phase, t in measure(src).items():
+            best[phase] = min(best[phase], t)
+    return {
+        "workload": name,
+        "size": n,
+        "bytes": len(src.encode()),
+        **best,
+        "total": sum(best.values()),
+    }
+
+
+def compare(results: typing.List[dict], old: typing.List[dict]):
+    """打印每个阶段和旧结果的比值, 小于 1 表示变快了."""
+    before = {(r["workload"], r["size"]): r for r in old}
+    for r in results:
+        o = before.get((r["workload"], r["size"]))
+        if not o:
+            continue
+        ratios = "  ".join(
+            f"{phase} {r[phase] / o[phase]:.2f}x" if o[phase] else f"{phase} -"
+            for phase in PHASES + ["total"]
+        )
+        print(f"{r['workload']}={r['size']}: {ratios}")
+
+
+def main():
+    args = argparse.ArgumentParser(prog="benchmarks.run")
+    args.add_argument(
+        "workloads",
+        nargs="*",
+        metavar="WORKLOAD[=N]",
+        help=f"默认运行所有的: {', '.join(workloads.WORKLOADS)}",
+    )
+    args.add_argument("--repeat", type=int, default=3, metavar="R")
+    args.add_argument("--out", metavar="FILE", help="把结果写成 JSON")
+    args.add_argument("--compare", metavar="FILE", help="和之前写出的结果对比")
+    args = args.parse_args()
+
+    todo = []
+    for w in args.workloads or workloads.WORKLOADS:
+        name, _, n = w.partition("=")
+        if name not in workloads.WORKLOADS:
+            args.error(f"unknown workload '{name}'")
+        todo.append((name, int(n) if n else workloads.SIZES[name]))
+
+    results = []
+    print(f"{'workload':<16}" + "".join(f"{p:>11}" for p in PHASES + ["total"]))
+    for name, n in todo:
+        r = run(name, n, args.repeat)
+        results.append(r)
+        times = "".join(f"{r[p]:>10.4f}s" for p in PHASES + ["total"])
+        print(f"{f'{name}={n}':<16}{times}", flush=True)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(
+                {
+                    "python": sys.version,
+                    "platform": platform.platform(),
+                    "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "repeat": args.repeat,
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)["results"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""\
+# Server
+
+比较每次都运行 `python -m lyzh FILE` 和向常驻服务 (见 lyzh.server) 发送请求的耗时. 服务通过标准输入输出
+通信, 每种请求都发送很多次, 统计平均每次的往返时间, 其中 lookup 几乎不做任何检查工作, 它的耗时就是
+协议本身的开销. 检查的文件是 benchmarks.machine 中的定义.
+
+    python -m benchmarks.server [N] [REQUESTS]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import benchmarks.machine as machine
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    with tempfile.TemporaryDirectory() as dir:
+        file = os.path.join(dir, "m.lyzh")
+        with open(file, "w") as f:
+            f.write(machine.generate(n))
+
+        cmd = [sys.executable, "-m", "lyzh", "--no-cache"]
+        start = time.perf_counter()
+        subprocess.run([*cmd, file], check=True, capture_output=True)
+        print(f"{'cli':<12} {(time.perf_counter() - start) * 1e3:>10.3f}ms")
+
+        p = subprocess.Popen(
+            [*cmd, "--serve"], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        assert p.stdin and p.stdout
+        queries = [
+            ("check", {"file": file}),
+            ("lookup", {"file": file, "name": "mul"}),
+            ("infer", {"file": file, "expr": "(add two) three"}),
+            ("normalize", {"file": file, "expr": "(add two) three"}),
+            ("check", {"file": file}),
+        ]
+        for i, (method, params) in enumerate(queries):
+            count = 1 if i == 0 else requests
+            start = time.perf_counter()
+            for _ in range(count):
+                req = {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+                p.stdin.write(json.dumps(req) + "\n")
+                p.stdin.flush()
+                assert "result" in json.loads(p.stdout.readline())
+            elapsed = (time.perf_counter() - start) / count
+            name = "first check" if i == 0 else method
+            print(f"{name:<12} {elapsed * 1e3:>10.3f}ms")
+        p.stdin.close()
+        p.wait()
+
+
+if __name__ == "__main__":
+    main()
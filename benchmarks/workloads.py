@@ -0,0 +1,99 @@
+"""\
+# Workloads
+
+可以按规模 n 生成的合成源文件, 供 benchmarks.run 使用. 每个生成器都是 `(n: int) -> str`, 生成的文件
+都能通过类型检查.
+"""
+
+import typing
+
+import benchmarks.conversion as conversion
+import benchmarks.parse as parse
+
+NAT = """\
+fn nat -> type {
+    (t : type) -> (s: (n: t) -> t) -> (z: t) -> t
+}
+
+fn add(a: nat) (b: nat) -> nat {
+    |t| { |s| { |z| { ((a t) s) (((b t) s) z) } } }
+}
+
+fn mul(a: nat) (b: nat) -> nat {
+    |t| { |s| { |z| { ((a t) ((b t) s)) z } } }
+}
+
+fn eq(t: type) (a: t) (b: t) -> type {
+    (p: (v: t) -> type) -> (pa: p a) -> p b
+}
+
+fn refl(t: type) (a: t) -> ((eq t) a) a {
+    |p| { |pa| { pa } }
+}
+
+fn one -> nat { |t| { |s| { |z| { s z } } } }
+
+fn two -> nat { (add one) one }
+"""
+
+
+def church(n: int) -> str:
+    """用 add 按二进制位拼出值为 n 的 Church numeral, 再用 mul two 换一种算法得到 2n, 证明两者相等.
+    normal form 中的 numeral 有 n (和 2n) 层, 打印和相等检查的开销都和 n 成正比."""
+    ds = [NAT, "fn c0 -> nat { one }\n"]
+    bits = bin(max(n, 1))[3:]
+    for i, bit in enumerate(bits, 1):
+        e = f"(add c{i - 1}) c{i - 1}"
+        if bit == "1":
+            e = f"(add ({e})) one"
+        ds.append(f"fn c{i} -> nat {{ {e} }}\n")
+    k = len(bits)
+    ds.append(
+        f"fn double -> ((eq nat) ((add c{k}) c{k})) ((mul two) c{k}) {{\n"
+        f"    (refl nat) ((add c{k}) c{k})\n"
+        f"}}\n"
+    )
+    return "\n".join(ds)
+
+
+def parens(n: int) -> str:
+    """套了 n 层括号的函数应用, 和 benchmarks.parens 不同, 它能通过类型检查."""
+    e = "((eq t) a) a"
+    for _ in range(n):
+        e = f"({e})"
+    return f"{NAT}\nfn deep(t: type) (a: t) -> type {{ {e} }}\n"
+
+
+def telescope(n: int) -> str:
+    """一个有 n 个参数的依赖函数类型, 后面的参数类型都依赖前面的参数, 以及它的一个实现和一次完整的应用."""
+    ps = " -> ".join(f"(x{i}: f x0)" for i in range(1, n + 1))
+    fn = " ".join(f"|x{i}| {{" for i in range(1, n + 1))
+    app = "((tele type) |x| { x })"
+    for _ in range(n + 1):
+        app = f"({app} type)"
+    return (
+        f"fn tele -> (t: type) -> (f: (x: t) -> type) -> (x0: t) -> {ps} -> f x0 {{\n"
+        f"    |t| {{ |f| {{ |x0| {{ {fn} x{n} {' '.join('}' * n)} }} }} }}\n"
+        f"}}\n\n"
+        f"fn full -> type {{ {app} }}\n"
+    )
+
+
+WORKLOADS: typing.Dict[str, typing.Callable[[int], str]] = {
+    "church": church,
+    "leibniz": conversion.generate,
+    "parens": parens,
+    "wide": parse.generate,
+    "telescope": telescope,
+}
+"""所有的生成器."""
+
+SIZES: typing.Dict[str, int] = {
+    "church": 10000,
+    "leibniz": 200,
+    "parens": 300,
+    "wide": 500,
+    "telescope": 300,
+}
+"""默认的规模, 每个大约需要零点几秒到一两秒. 语法嵌套的深度 (parens 和 telescope) 受限于解析器和
+类型检查器的递归深度."""
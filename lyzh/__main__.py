@@ -4,14 +4,23 @@
 命令行入口.
 """
 
+import argparse
+import contextlib
+import os
 import sys
+import time
 import typing
 
+import lyzh.abstract.data as ast
+import lyzh.abstract.normalize as normalize
 import lyzh.concrete.resolve as resolve
-import lyzh.concrete.data as cst
 import lyzh.concrete.elab as elab
+import lyzh.cache as cache
 import lyzh.core as core
-import lyzh.surface.grammar as grammar
+import lyzh.driver as driver
+import lyzh.printer as printer
+import lyzh.server as server
+import lyzh.stats as stats
 import lyzh.surface.parsec as parsec
 
 
@@ -20,22 +29,192 @@ def fatal(m: str | Exception) -> typing.Never:
     sys.exit(1)
 
 
-defs: core.Defs[cst.Expr] = []  # 尚未检查类型的定义
+def check(
+    d: driver.Driver,
+    file: str,
+    p: printer.Printer,
+    show_stats: str = "",
+    stream: bool = False,
+) -> bool:
+    """检查文件并用 p 打印结果, 返回是否成功. show_stats 是统计信息的格式, 为空则不统计. stream 则每检查
+    完一个定义就打印一个, 出错时前面的定义已经打印出来了."""
+    d.stats = stats.Stats() if show_stats else None
+    try:
+        with d.stats.counting(d.elaborator) if d.stats else contextlib.nullcontext():
+            # 加载源文件, 并解析出所有定义.
+            with open(file) as f:
+                src = f.read()
+            # 解析所有定义中的引用, 并开始类型检查.
+            if stream:
+                for checked in d.stream(src, file):
+                    with d.phase("print"):
+                        p.defn(checked)
+            else:
+                well_typed = d.check(src, file)
+                with d.phase("print"):
+                    for checked in well_typed:
+                        p.defn(checked)
+        p.finish()
+        return True
+    except FileNotFoundError as e:
+        print(e)
+    except (parsec.Error, resolve.Error, elab.Error, driver.Error) as e:
+        # 只有报告错误时才需要行号和列号.
+        if p.count and not p.json:
+            # 流式打印时前面的定义已经打印出来了.
+            p.finish()
+        p.count = 0
+        p.error(file, core.Lines.index(src), e)
+        p.out.flush()
+    finally:
+        if d.stats:
+            s = d.stats.json() if show_stats == "json" else d.stats.table()
+            print(s, file=sys.stderr)
+    return False
 
-# 获取文件名.
-try:
-    _, file, *_ = sys.argv
-except ValueError:
-    fatal("usage: lyzh FILE")
+
+def watch(
+    d: driver.Driver, file: str, p: printer.Printer, show_stats: str, stream: bool
+):
+    """文件每次修改之后, 重新检查发生了变化的定义."""
+    last = None
+    while True:
+        try:
+            mtime = os.stat(file).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != last:
+            last = mtime
+            if check(d, file, p, show_stats, stream):
+                print(f"-- rechecked: {', '.join(d.rechecked) or 'nothing'}")
+            print(flush=True)
+        time.sleep(0.2)
+
+
+args = argparse.ArgumentParser(prog="lyzh")
+args.add_argument("file", metavar="FILE", nargs="?")
+args.add_argument(
+    "--no-cache", action="store_true", help="不读取也不写入 __lyzhcache__ 中的检查结果"
+)
+args.add_argument(
+    "-j", "--jobs", type=int, default=1, metavar="N", help="用 N 个进程并行检查定义"
+)
+args.add_argument(
+    "--watch", action="store_true", help="文件修改后自动重新检查, 只检查发生变化的定义"
+)
+args.add_argument(
+    "--backend",
+    choices=elab.BACKENDS,
+    default="nbe",
+    help="求值器的实现: nbe 是默认的 normalization by evaluation, machine 是 CEK 抽象机, "
+    "need 是参数按需求值 (call-by-need) 的 CEK 抽象机",
+)
+args.add_argument(
+    "--jit",
+    action="store_true",
+    help="把经常用到的全局定义编译成 Python 函数, 抽象机 (machine 和 need) 不使用编译的结果",
+)
+args.add_argument(
+    "--hashcons",
+    action="store_true",
+    help="结构相同的节点只分配一次, 减少检查时分配的节点和占用的内存",
+)
+args.add_argument(
+    "--step-budget",
+    type=int,
+    metavar="N",
+    help="检查每个定义时最多计算 N 步 (beta reduction 和内置运算), 超出时报错",
+)
+args.add_argument(
+    "--size-budget",
+    type=int,
+    metavar="N",
+    help="检查每个定义时读回的值最多一共 N 个节点, 超出时报错",
+)
+args.add_argument(
+    "--time-budget",
+    type=float,
+    metavar="SECONDS",
+    help="检查每个定义时最多计算 SECONDS 秒, 超出时报错",
+)
+args.add_argument(
+    "--stream",
+    action="store_true",
+    help="逐个解析, 检查并打印定义, 适合非常大的文件, 出错时前面的定义已经打印出来",
+)
+args.add_argument(
+    "--json", action="store_true", help="每行输出一个定义的 JSON, 共享的子项只输出一次"
+)
+args.add_argument(
+    "--max-depth",
+    type=int,
+    metavar="N",
+    help="值最多打印 N 层, 更深的子项省略成 ...",
+)
+args.add_argument(
+    "--max-size",
+    type=int,
+    metavar="N",
+    help="每个值最多打印 N 个节点, 剩下的省略成 ...",
+)
+args.add_argument(
+    "--stats",
+    action="store_const",
+    const="table",
+    help="在标准错误中输出各阶段耗时, 每个定义的检查耗时和热点操作的调用次数",
+)
+args.add_argument(
+    "--stats-json",
+    action="store_const",
+    const="json",
+    dest="stats",
+    help="同 --stats, 但输出 JSON",
+)
+args.add_argument(
+    "--serve",
+    action="store_true",
+    help="作为常驻服务运行, 在标准输入输出上处理 JSON-RPC 请求, 不需要 FILE, 见 lyzh.server",
+)
+args.add_argument(
+    "--socket", metavar="PATH", help="同 --serve, 但在 Unix socket PATH 上处理请求"
+)
+args = args.parse_args()
+
+budget = None
+if (args.step_budget, args.size_budget, args.time_budget) != (None, None, None):
+    budget = normalize.Budget(args.step_budget, args.size_budget, args.time_budget)
+
+if args.serve or args.socket:
+    srv = server.Server(
+        args.backend, args.jit, not args.no_cache, args.jobs, budget, args.hashcons
+    )
+    try:
+        if args.socket:
+            srv.serve_socket(args.socket)
+        else:
+            srv.serve(sys.stdin, sys.stdout)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.close()
+    sys.exit(0)
+if args.file is None:
+    fatal("FILE is required unless --serve or --socket is given")
+
+store = None if args.no_cache else cache.Store(cache.path_for(args.file))
+# 只有 --watch 才需要保留检查结果.
+mk = ast.HashCons() if args.hashcons else ast.Builder()
+e = elab.Elaborator(mk=mk, backend=args.backend, jit=args.jit, budget=budget)
+d = driver.Driver(e, store=store, jobs=args.jobs, keep=args.watch)
+
+p = printer.Printer(sys.stdout, args.max_depth, args.max_size, args.json)
 
 try:
-    # 加载源文件, 并解析出所有定义.
-    with open(file) as f:
-        grammar.prog(defs)(parsec.Source(f.read()))
-    # 解析所有定义中的引用, 并开始类型检查.
-    well_typed = elab.Elaborator().elaborate(resolve.Resolver().resolve(defs))
-    print("\n\n".join(str(d) for d in well_typed))
-except FileNotFoundError as e:
-    fatal(e)
-except (parsec.Error, resolve.Error, elab.Error) as e:
-    fatal(f"{file}:{e}")
+    if args.watch:
+        watch(d, args.file, p, args.stats, args.stream)
+    elif not check(d, args.file, p, args.stats, args.stream):
+        sys.exit(1)
+except KeyboardInterrupt:
+    pass
+finally:
+    d.close()
@@ -0,0 +1,326 @@
+"""\
+# Binary format
+
+检查过的定义的紧凑二进制格式, 用于把检查结果缓存到磁盘上 (见 lyzh.cache), 以及模块的接口文件
+(见 lyzh.driver).
+
+一个定义被编码成一张名字表加上各个值的节点. 值按前序 (preorder) 依次写出每个节点的标签和它的字段, 子节点
+紧跟在父节点之后, 所以不需要记录任何长度或指针; 名字则只写出它在名字表中的序号. 整数都用 LEB128 变长
+编码, 绝大多数的 de Bruijn index 和名字序号都只占一个字节.
+
+变量的 ID 每次运行都不一样, 所以这里只保存名字: 对全局定义的引用在读取时通过名字找到这一次运行中的
+变量, 而参数名字则从读取它的会话 (core.Session) 中重新分配 ID, 反正 de Bruijn index 表示法中局部变量的 ID 只用于打印.
+
+同一次运行中的不同进程之间 (见 lyzh.driver 的并行检查) 则可以用 keep_ids 模式, 名字表中同时保存变量的
+ID, 读取时直接恢复原来的变量, 这样不同模块中的同名定义也不会混淆.
+"""
+
+import enum
+import typing
+
+import lyzh.abstract.data as ast
+import lyzh.core as core
+
+
+class Error(Exception): ...
+
+
+class Tag(enum.IntEnum):
+    """节点的标签, 占一个字节."""
+
+    IDX = 0
+    REF = 1
+    UNIV = 2
+    FN_TYPE = 3
+    FN = 4
+    APP = 5
+    NAT = 6
+    LIT = 7
+    PRIM = 8
+
+
+_IDX, _REF, _UNIV, _FN_TYPE, _FN, _APP, _NAT, _LIT, _PRIM = map(int, Tag)
+
+# 内置运算写出它在 ast.PRIMS 中的序号.
+_OPS = list(ast.PRIMS)
+
+
+class Writer:
+    """编码器."""
+
+    def __init__(self, keep_ids: bool = False):
+        self.out = bytearray()
+        self.keep_ids = keep_ids
+        # 名字表, 名字 (keep_ids 模式下是名字和 ID) 到序号的映射.
+        self.names: typing.Dict[str | typing.Tuple[str, core.ID], int] = {}
+
+    def uint(self, n: int):
+        """写出一个 LEB128 编码的非负整数."""
+        while n >= 0x80:
+            self.out.append(n & 0x7F | 0x80)
+            n >>= 7
+        self.out.append(n)
+
+    def name(self, v: core.Var):
+        """写出名字在名字表中的序号, 第一次出现的名字会被加入名字表."""
+        key = (v.text, v.id) if self.keep_ids else v.text
+        self.uint(self.names.setdefault(key, len(self.names)))
+
+    def term(self, tm: ast.Term):
+        """按前序写出值的所有节点, 同样用 todo 栈代替递归."""
+        todo = [tm]
+        while todo:
+            match todo.pop():
+                case ast.Idx(i, v):
+                    self.out.append(Tag.IDX)
+                    self.uint(i)
+                    self.name(v)
+                case ast.Ref(v):
+                    self.out.append(Tag.REF)
+                    self.name(v)
+                case ast.Univ():
+                    self.out.append(Tag.UNIV)
+                case ast.Nat():
+                    self.out.append(Tag.NAT)
+                case ast.Lit(n):
+                    self.out.append(Tag.LIT)
+                    self.uint(n)
+                case ast.Prim(op):
+                    self.out.append(Tag.PRIM)
+                    self.uint(_OPS.index(op))
+                case ast.FnType(p, b):
+                    self.out.append(Tag.FN_TYPE)
+                    self.name(p.name)
+                    todo.extend((b, p.type))
+                case ast.Fn(p, b):
+                    self.out.append(Tag.FN)
+                    self.name(p.name)
+                    todo.extend((b, p.type))
+                case ast.App(f, x):
+                    self.out.append(Tag.APP)
+                    todo.extend((x, f))
+                case _:
+                    raise AssertionError("impossible")
+
+    def defn(self, d: core.Def[ast.Term]):
+        """写出定义的参数, 返回类型和函数体, 名字和位置由调用者决定是否需要."""
+        self.uint(len(d.params))
+        for p in d.params:
+            self.name(p.name)
+            self.term(p.type)
+        self.term(d.ret)
+        self.term(d.body)
+
+    def finish(self) -> bytes:
+        """在节点之前加上名字表, 得到完整的编码."""
+        head = Writer()
+        head.uint(len(self.names))
+        for key in self.names:  # 字典保持插入顺序, 也就是序号的顺序
+            text, id = key if isinstance(key, tuple) else (key, 0)
+            data = text.encode()
+            head.uint(len(data))
+            head.out += data
+            if self.keep_ids:
+                head.uint(id)
+        return bytes(head.out + self.out)
+
+
+class Reader:
+    """解码器, globals 是这一次运行中全局定义的名字到变量的映射, session 用于分配新的 ID, 两者在
+    keep_ids 模式下都用不到."""
+
+    def __init__(
+        self,
+        data: bytes,
+        globals: typing.Dict[str, core.Var],
+        mk: ast.Builder,
+        session: core.Session,
+        keep_ids: bool = False,
+    ):
+        self.data = data
+        self.pos = 0
+        self.globals = globals
+        self.mk = mk
+        self.session = session
+        self.keep_ids = keep_ids
+        self.names: typing.List[str] = []
+        # keep_ids 模式下是原来的变量, 否则是 ast.Idx 中的名字, 它们只用于打印, 同名的共用同一个变量.
+        self.vars: typing.List[core.Var] = []
+        for _ in range(self.uint()):
+            text = self.text()
+            self.names.append(text)
+            self.vars.append(core.Var(text, self.uint() if keep_ids else 0))
+
+    def uint(self) -> int:
+        n = shift = 0
+        while True:
+            b = self.byte()
+            n |= (b & 0x7F) << shift
+            if b < 0x80:
+                return n
+            shift += 7
+
+    def byte(self) -> int:
+        try:
+            b = self.data[self.pos]
+        except IndexError:
+            raise Error("unexpected end of data")
+        self.pos += 1
+        return b
+
+    def text(self) -> str:
+        n = self.uint()
+        self.pos += n
+        return self.data[self.pos - n : self.pos].decode()
+
+    def name(self) -> str:
+        try:
+            return self.names[self.uint()]
+        except IndexError:
+            raise Error("bad name index")
+
+    def var(self) -> core.Var:
+        try:
+            return self.vars[self.uint()]
+        except IndexError:
+            raise Error("bad name index")
+
+    def op(self) -> str:
+        try:
+            return _OPS[self.uint()]
+        except IndexError:
+            raise Error("bad primitive index")
+
+    def fresh(self) -> core.Var:
+        """读取一个名字, 并为它分配新的 ID."""
+        if self.keep_ids:
+            return self.var()
+        return core.Var(self.name(), self.session.fresh())
+
+    def ref(self) -> core.Var:
+        if self.keep_ids:
+            return self.var()
+        text = self.name()
+        try:
+            return self.globals[text]
+        except KeyError:
+            raise Error(f"unknown global '{text}'")
+
+    def defn(self, loc: core.Loc, name: core.Var) -> core.Def[ast.Term]:
+        """读取 Writer.defn 写出的定义."""
+        ps = []
+        for _ in range(self.uint()):
+            v = self.fresh()
+            ps.append(core.Param[ast.Term](v, self.term()))
+        ret = self.term()
+        return core.Def[ast.Term](loc, name, ps, ret, self.term())
+
+    def term(self) -> ast.Term:
+        """读取一个值. 每个复合节点都恰好有两个子节点, 栈中保存还没读完子节点的复合节点:
+        它的标签, 参数名字 (如果有) 和已经读到的第一个子节点.
+
+        缓存命中时这里是最热的路径, 所以标签直接和整数比较, 避免 enum 的开销; core.Param 也不带类型
+        参数, 因为每次构造 core.Param[ast.Term] 都要经过一层 typing 的包装."""
+        mk = self.mk
+        stack: typing.List[typing.List[typing.Any]] = []
+        while True:
+            tag = self.byte()
+            if tag == _APP:
+                stack.append([_APP, None, None])
+                continue
+            elif tag == _IDX:
+                i = self.uint()
+                tm = mk.idx(i, self.var())
+            elif tag == _REF:
+                tm = mk.ref(self.ref())
+            elif tag == _FN_TYPE or tag == _FN:
+                stack.append([tag, self.fresh(), None])
+                continue
+            elif tag == _UNIV:
+                tm = mk.univ()
+            elif tag == _NAT:
+                tm = mk.nat()
+            elif tag == _LIT:
+                tm = mk.lit(self.uint())
+            elif tag == _PRIM:
+                tm = mk.prim(self.op())
+            else:
+                raise Error(f"bad tag {tag}")
+            # 一个节点读完了, 把它交给父节点, 父节点的子节点都读完了就继续往上.
+            while stack:
+                frame = stack[-1]
+                if frame[2] is None:
+                    frame[2] = tm
+                    break
+                stack.pop()
+                tag, v, first = frame
+                if tag == _APP:
+                    tm = mk.app(first, tm)
+                elif tag == _FN:
+                    tm = mk.fn(core.Param(v, first), tm)
+                else:
+                    tm = mk.fn_type(core.Param(v, first), tm)
+            else:
+                return tm
+
+
+def encode(
+    g: core.Def[ast.Term], nf: core.Def[ast.Term], keep_ids: bool = False
+) -> bytes:
+    """编码一个检查过的定义. 和 Elaborator.elaborate_def 一样, g 是保存在全局中的版本, 参数类型和
+    返回类型不是 normal form, nf 是检查的结果, 两者的函数体相同, 只写一次."""
+    w = Writer(keep_ids)
+    w.defn(g)
+    for p in nf.params:
+        w.term(p.type)
+    w.term(nf.ret)
+    return w.finish()
+
+
+def decode(
+    data: bytes,
+    d: core.Def[typing.Any],
+    globals: typing.Dict[str, core.Var],
+    mk: ast.Builder,
+    session: core.Session,
+    keep_ids: bool = False,
+) -> typing.Tuple[core.Def[ast.Term], core.Def[ast.Term]]:
+    """解码 encode 的结果, 位置和名字使用这一次运行中的定义 d 的, 返回值和 encode 的参数相同."""
+    r = Reader(data, globals, mk, session, keep_ids)
+    g = r.defn(d.loc, d.name)
+    nf_ps = [core.Param[ast.Term](p.name, r.term()) for p in g.params]
+    nf_ret = r.term()
+    if r.pos != len(data):
+        raise Error("trailing data")
+    return g, core.Def[ast.Term](d.loc, d.name, nf_ps, nf_ret, g.body)
+
+
+def encode_interface(defs: core.Defs[ast.Term], keep_ids: bool = False) -> bytes:
+    """编码一个模块导出的所有定义, 即它们保存在全局中的版本."""
+    w = Writer(keep_ids)
+    w.uint(len(defs))
+    for d in defs:
+        w.name(d.name)
+        w.uint(d.loc)
+        w.defn(d)
+    return w.finish()
+
+
+def decode_interface(
+    data: bytes,
+    globals: typing.Dict[str, core.Var],
+    mk: ast.Builder,
+    session: core.Session,
+    keep_ids: bool = False,
+) -> core.Defs[ast.Term]:
+    """解码 encode_interface 的结果, globals 是这个模块导入的定义, 读到的定义会依次加入到 globals
+    中, 因为后面的定义可以引用前面的定义. 除了 keep_ids 模式, 读到的定义都分配了新的 ID."""
+    r = Reader(data, globals, mk, session, keep_ids)
+    defs = []
+    for _ in range(r.uint()):
+        name = r.fresh()
+        defs.append(r.defn(r.uint(), name))
+        globals[name.text] = name
+    if r.pos != len(data):
+        raise Error("trailing data")
+    return defs
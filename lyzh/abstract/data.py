@@ -2,73 +2,217 @@
 # Abstract syntax
 
 这个层级的值能够被深度求值, 但也可能是没法继续求值的形式, 即 normal form.
+
+这里使用的是 locally nameless 表示法: 被函数 (或函数类型) 绑定的变量用 de Bruijn index 表示, 即
+"往外数第几个绑定者", 例如 `|x| { |y| { x } }` 中的 x 就是 1; 而全局定义则直接用它的名字引用.
+这样一个全局定义就是一个封闭的 (closed) 值, 任何地方引用它都不需要刷新内部变量的 ID.
 """
 
 import dataclasses
+import operator
 import typing
+import weakref
 
 import lyzh.core as core
 
 
-@dataclasses.dataclass
-class Term: ...
+# 节点的数量非常多, 所以它们都用 __slots__ 代替 __dict__, 每个节点只占几十个字节; HashCons 的表中是
+# 节点的弱引用, 所以还需要 __weakref__.
+@dataclasses.dataclass(slots=True, weakref_slot=True)
+class Term:
+    def __str__(self):
+        return show(self)
+
+
+@dataclasses.dataclass(slots=True)
+class Idx(Term):
+    """局部变量引用, 即 de Bruijn index."""
+
+    i: int
+    v: core.Var = dataclasses.field(compare=False)  # 原来的名字, 仅用于打印
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Ref(Term):
-    """变量引用."""
+    """全局定义引用."""
 
     v: core.Var
 
-    def __str__(self):
-        return str(self.v)
 
-
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Univ(Term):
     """类型宇宙."""
 
-    def __str__(self):
-        return "type"
 
+@dataclasses.dataclass(slots=True)
+class Nat(Term):
+    """内置的自然数类型."""
+
+
+@dataclasses.dataclass(slots=True)
+class Lit(Term):
+    """自然数字面量, 直接用 Python 的整数表示, 所以可以任意大."""
+
+    n: int
 
-@dataclasses.dataclass
+
+@dataclasses.dataclass(slots=True)
+class Prim(Term):
+    """内置的自然数运算, op 是 PRIMS 中的名字."""
+
+    op: str
+
+
+@dataclasses.dataclass(slots=True)
 class FnType(Term):
     """函数类型."""
 
     p: core.Param[Term]
     body: Term
 
-    def __str__(self):
-        return f"{self.p} -> {self.body}"
-
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Fn(Term):
     """函数."""
 
     p: core.Param[Term]  # 此时函数的参数类型确定
     body: Term
 
-    def __str__(self):
-        return f"|{self.p}| {{ {self.body} }}"
-
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class App(Term):
     """函数应用."""
 
     f: Term
     x: Term
 
-    def __str__(self):
-        return f"({self.f} {self.x})"
 
+PRIMS: typing.Dict[str, typing.Callable[[int, int], int]] = {
+    "Add": operator.add,
+    "Mul": operator.mul,
+}
+"""内置的自然数运算, 类型都是 Nat -> Nat -> Nat. 两个参数都是字面量时直接用 Python 的整数计算, 不需要像
+Church numeral 那样一步步展开."""
+
+
+def show(tm: Term) -> str:
+    """打印一个值."""
+    return "".join(pieces(tm))
+
+
+def pieces(
+    tm: Term,
+    max_depth: typing.Optional[int] = None,
+    max_size: typing.Optional[int] = None,
+) -> typing.Iterator[str]:
+    """按顺序产出打印 tm 的文本片段, 调用者可以边产出边写出去, 不需要拼出整个字符串. 为了能处理非常深
+    的值, 这里不使用递归, 而是用 todo 栈保存还没打印的子项 (和它的深度) 以及文本片段.
+
+    深度达到 max_depth (最外层的深度是 0), 或者已经打印了 max_size 个节点之后, 剩下的子项都省略成
+    `...`."""
+    todo: typing.List[typing.Tuple[Term, int] | str] = [(tm, 0)]
+    size = 0
+    while todo:
+        item = todo.pop()
+        if isinstance(item, str):
+            yield item
+            continue
+        tm, depth = item
+        if (max_depth is not None and depth >= max_depth) or (
+            max_size is not None and size >= max_size
+        ):
+            yield "..."
+            continue
+        size += 1
+        depth += 1
+        match tm:
+            case Idx(_, v) | Ref(v):
+                yield v.text
+            case Univ():
+                yield "type"
+            case Nat():
+                yield "Nat"
+            case Lit(n):
+                yield core.show_nat(n)
+            case Prim(op):
+                yield op
+            case FnType(p, b):
+                todo.extend(((b, depth), ") -> ", (p.type, depth), f"({p.name}: "))
+            case Fn(p, b):
+                todo.extend(
+                    (" }", (b, depth), ")| { ", (p.type, depth), f"|({p.name}: ")
+                )
+            case App(f, x):
+                todo.extend((")", (x, depth), " ", (f, depth), "("))
+            case _:
+                raise AssertionError("impossible")
+
+
+class Builder:
+    """构造 ast.Term 的工厂, 默认每次都分配一个新的节点, count 记录分配的节点数量."""
+
+    def __init__(self):
+        self.count = 0
+
+    def idx(self, i: int, v: core.Var) -> Term:
+        return self.new(Idx, (Idx, i, v.text), i, v)
+
+    def ref(self, v: core.Var) -> Term:
+        return self.new(Ref, (Ref, v.id), v)
+
+    def univ(self) -> Term:
+        return self.new(Univ, (Univ,))
+
+    def nat(self) -> Term:
+        return self.new(Nat, (Nat,))
+
+    def lit(self, n: int) -> Term:
+        return self.new(Lit, (Lit, n), n)
+
+    def prim(self, op: str) -> Term:
+        return self.new(Prim, (Prim, op), op)
+
+    def fn_type(self, p: core.Param[Term], body: Term) -> Term:
+        return self.new(FnType, (FnType, p.name.text, id(p.type), id(body)), p, body)
+
+    def fn(self, p: core.Param[Term], body: Term) -> Term:
+        return self.new(Fn, (Fn, p.name.text, id(p.type), id(body)), p, body)
+
+    def app(self, f: Term, x: Term) -> Term:
+        return self.new(App, (App, id(f), id(x)), f, x)
+
+    def new(self, cls: typing.Type[Term], key: typing.Tuple, *args) -> Term:
+        """分配一个新的节点, key 是节点的结构, 这里用不到."""
+        self.count += 1
+        return cls(*args)
+
+
+class HashCons(Builder):
+    """Hash consing 工厂, 结构相同的节点只会分配一次, 之后直接复用同一个对象, 这样相等的子项可以直接用
+    `is` 判断. 由于子节点已经被共享, 所以节点的结构可以用子节点的 id 来表示; 父节点持有子节点,
+    所以只要表里的父节点还活着, 这些 id 就不会被复用. 表中的节点是弱引用, 没有人使用时会被自动回收.
+
+    注意 ast.Idx 的名字虽然不参与相等比较, 但会影响打印, 所以名字也是结构的一部分. 另外相等检查 (见
+    lyzh.abstract.unify) 比较的是值而不是 ast.Term, 所以 hash consing 并不会让它变快, 节省的是读回和
+    检查时分配的节点, 以及它们占用的内存."""
+
+    def __init__(self):
+        super().__init__()
+        self.hits = 0
+        self.table: weakref.WeakValueDictionary[typing.Tuple, Term] = (
+            weakref.WeakValueDictionary()
+        )
+
+    def new(self, cls: typing.Type[Term], key: typing.Tuple, *args) -> Term:
+        tm = self.table.get(key)
+        if tm is not None:
+            self.hits += 1
+            return tm
+        tm = super().new(cls, key, *args)
+        self.table[key] = tm
+        return tm
 
-type Globals = typing.Dict[core.ID, core.Def[Term]]
-"""全局变量定义, 在学术中叫做 Sigma, ∑, 其实就是 global context."""
 
-type Locals = typing.Dict[core.ID, Term]
-"""本地变量定义, 在学术中叫做 Gamma, Γ (对, 论文里最常出现的那个), 其实就是 local context,
-注意这里的映射值的结构是 Term, 但实际上它只能是该变量的类型 (type term), 不能是一个值 (value
-term)."""
+type Globals = typing.Dict[core.ID, core.Def[Term]]
+"""全局变量定义, 在学术中叫做 Sigma, ∑, 其实就是 global context. 定义的参数类型, 返回类型和函数体中,
+参数都是用 de Bruijn index 引用的."""
@@ -0,0 +1,131 @@
+"""\
+# Closure compilation
+
+把全局定义的值编译成 Python 函数. Normalizer 每次调用一个闭包, 都要用 eval 把函数体重新解释一遍, 而像
+add, mul 和 eq 这样的定义会被调用成千上万次. 这里把定义中的每个函数体都生成为一个 Python 函数, 例如
+add 最里面的函数体 `((a t) s) (((b t) s) z)` 会生成:
+
+```
+def c9(env):
+    t1 = apply(env[-5], env[-3])
+    t2 = apply(t1, env[-2])
+    t3 = apply(env[-4], env[-3])
+    t4 = apply(t3, env[-2])
+    t5 = apply(t4, env[-1])
+    t6 = apply(t2, t5)
+    return t6
+```
+
+它在环境 env 下直接构造出函数体的值, 和 eval 的结果完全相同, 然后用 compile 和 exec 一次性编译好. 函数体
+中的函数 (或函数类型) 会打包成带着编译好的函数体的闭包, 所以调用它们时也不需要再解释.
+
+每个函数调用都是单独的一条语句, 所以生成的代码没有任何嵌套, 再深的函数体 (例如很大的 Church numeral)
+也能编译, 执行时也不会递归. 生成代码时同样用 todo 栈代替递归, 每个函数体都是单独生成的.
+"""
+
+import typing
+
+import lyzh.abstract.data as ast
+import lyzh.abstract.value as val
+import lyzh.core as core
+
+HOT = 16
+"""一个全局定义被用到多少次之后才编译它. 编译本身的开销和定义的大小成正比, 很大的定义 (例如算出来的
+Church numeral) 往往只会被用到一两次, 编译它们反而更慢."""
+
+
+class _Compiler:
+    """代码生成器, 生成的函数和用到的常量都放在 names 中, 它就是生成的代码的全局命名空间."""
+
+    def __init__(
+        self,
+        apply: typing.Callable[[val.Value, val.Value], val.Value],
+        ref: typing.Callable[[core.Var], val.Value],
+    ):
+        self.names: typing.Dict[str, typing.Any] = {
+            "apply": apply,
+            "ref": ref,
+            "Param": core.Param,
+            "Closure": val.Closure,
+            "Fn": val.Fn,
+            "FnType": val.FnType,
+            "UNIV": val.Univ(),
+            "NAT": val.Nat(),
+        }
+        self.lines: typing.List[str] = []
+        # 还没有生成的函数体, 即函数的名字和函数体.
+        self.todo: typing.List[typing.Tuple[str, ast.Term]] = []
+
+    def const(self, x: typing.Any) -> str:
+        name = f"k{len(self.names)}"
+        self.names[name] = x
+        return name
+
+    def function(self, tm: ast.Term) -> str:
+        """为 tm 预留一个函数的名字, 稍后再生成它."""
+        name = f"c{len(self.names)}"
+        self.names[name] = None
+        self.todo.append((name, tm))
+        return name
+
+    def body(self, name: str, tm: ast.Term):
+        """生成在 env 下构造 tm 的值的函数. 按后序遍历 tm, 叶子节点直接作为表达式放到 args 栈中, 复合
+        节点则生成一条语句, 把结果赋给一个新的局部变量."""
+        self.lines.append(f"def {name}(env):\n")
+        n = 0  # 局部变量的数量
+        args: typing.List[str] = []
+        # 还没有生成的子项, 以及拼装复合节点的步骤, 即只有复合节点本身的 tuple, 表示它的子项都生成完了.
+        todo: typing.List[ast.Term | typing.Tuple[ast.Term]] = [tm]
+        while todo:
+            match todo.pop():
+                case ast.Idx(i):
+                    args.append(f"env[{-1 - i}]")
+                case ast.Ref(v):
+                    args.append(f"ref({self.const(v)})")
+                case ast.Univ():
+                    args.append("UNIV")
+                case ast.Nat():
+                    args.append("NAT")
+                # 字面量和还没有参数的内置运算都是不可变的值, 所有的调用共用同一个对象.
+                case ast.Lit(n):
+                    args.append(self.const(val.Lit(n)))
+                case ast.Prim(op):
+                    args.append(self.const(val.Prim(op)))
+                case ast.App(f, x) as t:
+                    todo.extend(((t,), x, f))
+                case ast.Fn(p, _) | ast.FnType(p, _) as t:
+                    todo.extend(((t,), p.type))
+                case (ast.App(),):
+                    x = args.pop()
+                    n += 1
+                    self.lines.append(f"    t{n} = apply({args.pop()}, {x})\n")
+                    args.append(f"t{n}")
+                case (ast.Fn(p, b) | ast.FnType(p, b) as t,):
+                    cls = "Fn" if isinstance(t, ast.Fn) else "FnType"
+                    c = f"Closure(env, {self.const(b)}, {self.function(b)})"
+                    n += 1
+                    self.lines.append(
+                        f"    t{n} = {cls}(Param({self.const(p.name)}, {args.pop()}), {c})\n"
+                    )
+                    args.append(f"t{n}")
+                case _:
+                    raise AssertionError("impossible")
+        self.lines.append(f"    return {args.pop()}\n")
+
+    def run(self):
+        """生成所有预留的函数并编译."""
+        while self.todo:
+            self.body(*self.todo.pop())
+        exec(compile("".join(self.lines), "<lyzh.jit>", "exec"), self.names)
+
+
+def compile_term(
+    tm: ast.Term,
+    apply: typing.Callable[[val.Value, val.Value], val.Value],
+    ref: typing.Callable[[core.Var], val.Value],
+) -> val.Code:
+    """编译 tm, apply 和 ref 是求值器的函数调用和全局定义引用."""
+    c = _Compiler(apply, ref)
+    name = c.function(tm)
+    c.run()
+    return c.names[name]
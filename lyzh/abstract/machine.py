@@ -0,0 +1,169 @@
+"""\
+# Abstract machine
+
+基于抽象机的求值器, 和 lyzh.abstract.normalize 的接口完全相同, 可以直接替换它 (见
+lyzh.concrete.elab.BACKENDS).
+
+Normalizer.eval 虽然用 todo 栈代替了递归, 但每次调用函数 (beta reduction) 都要经过 apply 和 inst 再
+调用一次 eval, 嵌套的调用越多, Python 的调用栈就越深; 全局定义每被应用一个参数, 展开它的 val.Lazy
+也会多套一层. 这里则是一台 CEK 机: C (control) 是当前要求值的 ast.Term, E (environment) 是它的
+环境, K (continuation) 是一个栈, 保存拿到当前的结果之后还要做什么. 调用闭包时只是把 C 和 E 换成闭包的
+函数体和环境, 继续在同一个循环中执行, 所以每一步的开销都是固定的, 也不会用到 Python 的递归.
+
+读回 (quote) 已经是迭代的了, 它对每个闭包调用一次 eval 得到函数体的值, 就是所谓的 strong reduction:
+函数体内部也会被继续求值. 全局定义的展开则一次性把定义的值应用到整个 spine 上, 不再嵌套 val.Lazy.
+
+闭包中编译好的函数体 (见 lyzh.abstract.jit) 在这里不会被使用, 因为执行它们又会回到 Python 的递归, 所以
+这里也不会编译全局定义.
+"""
+
+import functools
+import typing
+
+import lyzh.abstract.data as ast
+import lyzh.abstract.normalize as normalize
+import lyzh.abstract.value as val
+import lyzh.core as core
+
+# continuation 栈中的帧, 第一个元素是下面的标签:
+# (_ARG, env, x): 函数已经求值完, 接下来在 env 下求值参数 x;
+# (_CALL, f): 参数已经求值完, 接下来调用 f;
+# (_FN, env, name, body) 和 (_FN_TYPE, ...): 参数类型已经求值完, 接下来打包成闭包;
+# (_APPLY, x): 和 _CALL 相反, 函数 (即被调用的 thunk) 已经求值完, 接下来用 x 调用它;
+# (_UPDATE, thunk): thunk 已经求值完, 把结果记到 thunk 中.
+_ARG, _CALL, _FN, _FN_TYPE, _APPLY, _UPDATE = range(6)
+
+
+class Machine(normalize.Normalizer):
+    """CEK 机求值器."""
+
+    lazy: typing.ClassVar[bool] = False  # 参数是否按需求值, 见 Need
+    compiled = False
+
+    def eval(self, env: val.Env, tm: ast.Term) -> val.Value:
+        """在环境 env 下将 tm 求值成语义值. 外层循环的每一轮先沿着 C 往下走, 直到得到一个值, 然后由内层
+        循环把它交给 K 中的帧, 遇到需要继续求值的帧时再回到外层循环."""
+        k: typing.List[typing.Tuple] = []
+        fuel = self.fuel
+        while True:
+            match tm:
+                case ast.Idx(i):
+                    v = env[-1 - i]
+                case ast.App(f, x):
+                    k.append((_ARG, env, x))
+                    tm = f
+                    continue
+                case ast.Ref(g):
+                    v = self.ref(g)
+                case ast.Fn(p, b):
+                    k.append((_FN, env, p.name, b))
+                    tm = p.type
+                    continue
+                case ast.FnType(p, b):
+                    k.append((_FN_TYPE, env, p.name, b))
+                    tm = p.type
+                    continue
+                case ast.Univ():
+                    v = val.Univ()
+                case ast.Nat():
+                    v = val.Nat()
+                case ast.Lit(n):
+                    v = val.Lit(n)
+                case ast.Prim(op):
+                    v = val.Prim(op)
+                case _:
+                    raise AssertionError("impossible")
+            while k:
+                frame = k.pop()
+                tag = frame[0]
+                if tag == _ARG:
+                    k.append((_CALL, v))
+                    _, e, x = frame
+                    if not self.lazy:
+                        env, tm = e, x
+                        break
+                    # 参数不求值, 直接调用. 变量和全局定义的引用求值起来和 thunk 一样便宜 (后者本身
+                    # 就是延迟展开的), 不需要再包一层.
+                    match x:
+                        case ast.Idx(i):
+                            v = e[-1 - i]
+                        case ast.Ref(g):
+                            v = self.ref(g)
+                        case _:
+                            v = val.Thunk(e, x)
+                elif tag == _CALL or tag == _APPLY:
+                    f, x = (frame[1], v) if tag == _CALL else (v, frame[1])
+                    while isinstance(f, val.Thunk) and f.tm is None:
+                        f = f.v
+                    if isinstance(f, val.Thunk):
+                        # 被调用的是还没求值的 thunk, 先在同一个循环中求值它.
+                        k.append((_APPLY, x))
+                        k.append((_UPDATE, f))
+                        env, tm = f.env, f.tm
+                        break
+                    if isinstance(f, val.Fn):
+                        # beta reduction, 直接进入闭包的函数体.
+                        if fuel:
+                            fuel.step()
+                        env, tm = f.body.env + (x,), f.body.body
+                        break
+                    v = self.apply(f, x)
+                elif tag == _UPDATE:
+                    t = frame[1]
+                    t.v = v
+                    t.env = t.tm = None
+                elif tag == _FN:
+                    _, e, name, b = frame
+                    v = val.Fn(core.Param(name, v), val.Closure(e, b))
+                else:
+                    _, e, name, b = frame
+                    v = val.FnType(core.Param(name, v), val.Closure(e, b))
+            else:
+                return v
+
+    def apply(self, f: val.Value, *args: val.Value) -> val.Value:
+        """函数调用, 调用闭包时由 eval 进入函数体."""
+        for x in args:
+            match f:
+                case val.Fn(_, b):
+                    if self.fuel:
+                        self.fuel.step()
+                    f = self.eval(b.env + (x,), b.body)
+                case val.Neutral(lvl, v, spine):
+                    f = val.Neutral(lvl, v, spine + (x,))
+                case val.Global(v, spine):
+                    spine += (x,)
+                    f = val.Global(
+                        v, spine, val.Lazy(functools.partial(self.unfold, v, spine))
+                    )
+                case val.Prim(op, spine):
+                    f = self.prim(op, spine + (x,))
+                case _:
+                    raise AssertionError("impossible")
+        return f
+
+    def unfold(self, v: core.Var, spine: val.Spine) -> val.Value:
+        """展开被应用到 spine 上的全局定义 v."""
+        return self.apply(self.glob(v).value, *spine)
+
+
+class Need(Machine):
+    """call-by-need 求值器. 函数的参数不会在调用之前求值, 而是打包成 val.Thunk, 第一次被用到时才求值,
+    之后所有用到它的地方共用同一个结果. 没有被用到的参数就完全不用求值了; 被用到很多次的参数 (例如
+    Church numeral 中的 s 和 z) 也只求值一次.
+
+    值中可能出现 thunk, 所以 force 和 apply 要先求值它们. 读回和相等检查都会经过 force (或
+    Normalizer.demand), 所以最后的 normal form 和其他求值器完全相同."""
+
+    lazy = True
+
+    def force(self, v: val.Value) -> val.Value:
+        v = self.demand(v)
+        while isinstance(v, val.Global):
+            v = self.demand(v.unfolded.force())
+        return v
+
+    def apply(self, f: val.Value, *args: val.Value) -> val.Value:
+        for x in args:
+            f = super().apply(self.demand(f), x)
+        return f
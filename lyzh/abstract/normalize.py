@@ -10,74 +10,328 @@ abstract syntax 层面之后, 这些数值已经失去了相应的类型信息,
 
 另外, 求值同样能被看作 constant folding (常量传播) 的一种过程, 我们可以毫不夸张地称一个求值器为
 inliner (内联器). 此时, 你就已经学会了 Scala 3 中 inline 关键词及其元编程机制的原理了.
+
+具体来说分为两步: evaluate 把 ast.Term 求值成语义域 (见 lyzh.abstract.value) 中的值, 函数体被打包成闭包,
+变量查找只是读取环境, 不需要复制任何子树; quote 再把值读回成 normal form 的 ast.Term.
+
+一个定义的参数在 ast.Term 中用 de Bruijn index 引用, 所以 to_value 与 to_type 在参数外面直接套上
+函数 (或函数类型) 就得到一个封闭的值, 不需要做任何变量替换.
 """
 
 import dataclasses
+import enum
+import math
+import time
 import typing
 
 import lyzh.abstract.data as ast
+import lyzh.abstract.jit as jit
+import lyzh.abstract.value as val
 import lyzh.core as core
-from lyzh.abstract.rename import rename
+
+
+class _Step(enum.Enum):
+    """eval 和 quote 的 todo 栈中的步骤."""
+
+    EVAL = enum.auto()
+    QUOTE = enum.auto()
+    APP = enum.auto()
+    FN = enum.auto()
+    FN_TYPE = enum.auto()
+
+
+class Exhausted(Exception):
+    """求值用完了预算中的某种资源."""
+
+    def __init__(self, resource: str, limit: float):
+        super().__init__(resource, limit)
+        self.resource = resource  # steps, size 或 time, 即 Budget 的字段名
+        self.limit = limit
+
+
+@dataclasses.dataclass
+class Budget:
+    """检查一个定义时, 求值, 读回和相等检查一共可以使用的资源, None 表示不限制. 语言底下是 lambda
+    calculus, 一个定义 (例如很大的 Church numeral 的幂) 就可能算上几分钟或者耗尽内存, 超出预算时则抛出
+    Exhausted, 见 lyzh.concrete.elab.OutOfBudget."""
+
+    steps: typing.Optional[int] = None  # 计算的步数, 即 beta reduction 和内置运算的次数
+    size: typing.Optional[int] = None  # 读回时构造的节点数
+    time: typing.Optional[float] = None  # 秒数
+
+
+# 每隔多少次操作检查一次时间, 每次都读取时钟的开销太大.
+_CLOCK_EVERY = 1024
+
+
+@dataclasses.dataclass
+class Fuel:
+    """按照 budget 计量资源的使用, 每个定义开始检查时调用 refill 重新装满."""
+
+    budget: Budget
+    steps: int = 0
+    size: int = 0
+    ops: int = 0  # 所有操作的次数, 用于决定什么时候检查时间
+    deadline: float = math.inf
+
+    def refill(self):
+        self.steps = self.size = self.ops = 0
+        t = self.budget.time
+        self.deadline = math.inf if t is None else time.perf_counter() + t
+
+    def step(self):
+        """计算了一步."""
+        self.steps += 1
+        if self.budget.steps is not None and self.steps > self.budget.steps:
+            raise Exhausted("steps", self.budget.steps)
+        self.tick()
+
+    def node(self):
+        """读回时构造了一个节点."""
+        self.size += 1
+        if self.budget.size is not None and self.size > self.budget.size:
+            raise Exhausted("size", self.budget.size)
+        self.tick()
+
+    def tick(self):
+        """进行了一次操作, 例如相等检查中比较了一对值, 只检查时间."""
+        self.ops += 1
+        if self.ops % _CLOCK_EVERY == 0 and time.perf_counter() > self.deadline:
+            raise Exhausted("time", typing.cast(float, self.budget.time))
+
+
+@dataclasses.dataclass
+class Global:
+    """一个全局定义求值后的结果, 即套上参数后的值和类型."""
+
+    d: core.Def[ast.Term]  # 求值时的定义, 定义被替换后这个结果就失效了
+    value: val.Value
+    type: val.Value
+    uses: int = 0  # 缓存命中的次数, 达到 jit.HOT 时编译这个定义
+
+
+@dataclasses.dataclass
+class Cache:
+    """全局定义的求值缓存, 每个定义只需要求值一次, 之后每次引用都直接复用."""
+
+    entries: typing.Dict[core.ID, Global] = dataclasses.field(default_factory=dict)
+    hits: int = 0
+    misses: int = 0
 
 
 @dataclasses.dataclass
 class Normalizer:
-    # env 在学术里又叫做 rho, ρ, evaluation context, evaluation environment 等等,
-    # 要时刻注意这里的映射值的结构是 ast.Term, 和 ast.Locals 不同, 它可以是类型 (type term),
-    # 也可以是值 (value term), 因为这里要做的事情无非就是变量替换 (substitution).
-    #
-    # 所以, 根据惯例, 变量到变量类型的映射 (也就是 locals, Gamma, Γ) 我们习惯叫 context,
-    # 变量到值的映射 (也就是 env, pho, ρ) 我们叫 environment.
-    env: typing.Dict[core.ID, ast.Term] = dataclasses.field(default_factory=dict)
-
-    def term(self, tm: ast.Term) -> ast.Term:
-        """对单个值进行求值."""
-        match tm:
-            case ast.Ref(v):
-                try:
-                    # 进行变量替换, 并且刷新内部变量的引用.
-                    return self.term(rename(self.env[v.id]))
-                except KeyError:
-                    return tm
-            case ast.App(f, x):
-                f = self.term(f)
-                x = self.term(x)
-                match f:
-                    case ast.Fn(p, b):
-                        # 将 b 里面 p.name 出现的地方替换为 x.
-                        return self.subst((p.name, x), b)
-                    case _:
-                        return ast.App(f, x)
-            case ast.Fn(p, b):
-                # 对参数类型和函数体求值, 并保持原样.
-                return ast.Fn(self.param(p), self.term(b))
-            case ast.FnType(p, b):
-                # 对参数类型和函数类型体求值, 并保持原样.
-                return ast.FnType(self.param(p), self.term(b))
-            case ast.Univ():
-                return tm
-        raise AssertionError("impossible")
-
-    def param(self, p: core.Param[ast.Term]) -> core.Param[ast.Term]:
-        """对参数类型求值."""
-        return core.Param[ast.Term](p.name, self.term(p.type))
-
-    def subst(self, m: typing.Tuple[core.Var, ast.Term], tm: ast.Term) -> ast.Term:
-        """提供一组映射, 并对 tm 进行求值."""
-        (v, x) = m
-        self.env[v.id] = x
-        return self.term(tm)
-
-    def apply(self, f: ast.Term, *args: ast.Term) -> ast.Term:
-        """模拟函数调用, 如果 f 是函数, 则不断用它的函数体进行变量替换."""
-        ret = f
+    """求值器, 全局定义在求值时按需展开."""
+
+    globals: ast.Globals
+    mk: ast.Builder = dataclasses.field(default_factory=ast.Builder)  # 读回时构造节点
+    cache: Cache = dataclasses.field(default_factory=Cache)
+    # 是否把经常用到的全局定义编译成 Python 函数 (见 lyzh.abstract.jit), 之后调用其中的闭包时直接执行
+    # 编译好的函数体.
+    jit: bool = False
+    # 这个求值器是否执行编译好的函数体, 不执行的话 (见 lyzh.abstract.machine) 编译它们就没有意义了,
+    # 这时 jit 不起作用.
+    compiled: typing.ClassVar[bool] = True
+    # 资源的计量, 为 None 时不限制.
+    fuel: typing.Optional[Fuel] = None
+
+    def glob(self, v: core.Var) -> Global:
+        """获取全局定义 v 的值和类型, 优先使用缓存."""
+        d = self.globals[v.id]
+        try:
+            g = self.cache.entries[v.id]
+            if g.d is d:
+                self.cache.hits += 1
+                if self.jit and self.compiled and g.uses < jit.HOT:
+                    g.uses += 1
+                    if g.uses == jit.HOT:
+                        code = jit.compile_term(to_value(d), self.apply, self.ref)
+                        g.value = code(())
+                return g
+        except KeyError:
+            pass
+        self.cache.misses += 1
+        # 全局定义是封闭的, 直接在空环境下求值即可, 不需要刷新任何变量.
+        g = Global(d, self.eval((), to_value(d)), self.eval((), to_type(d)))
+        self.cache.entries[v.id] = g
+        return g
+
+    def eval(self, env: val.Env, tm: ast.Term) -> val.Value:
+        """在环境 env 下将 tm 求值成语义值. env 在学术里又叫做 rho, ρ, evaluation environment.
+
+        为了能处理非常深的表达式, 这里不使用递归, 而是用 todo 栈保存还没有求值的子表达式和拼装结果的
+        步骤, 子表达式的结果依次放到 out 栈中."""
+        todo: typing.List[typing.Tuple] = [(_Step.EVAL, env, tm)]
+        out: typing.List[val.Value] = []
+        while todo:
+            match todo.pop():
+                case (_Step.EVAL, env, tm):
+                    match tm:
+                        case ast.Idx(i):
+                            out.append(env[-1 - i])
+                        case ast.Ref(v):
+                            out.append(self.ref(v))
+                        case ast.App(f, x):
+                            # 先求值 f 再求值 x, 最后调用.
+                            todo.append((_Step.APP,))
+                            todo.append((_Step.EVAL, env, x))
+                            todo.append((_Step.EVAL, env, f))
+                        case ast.Fn(p, b):
+                            todo.append((_Step.FN, env, p.name, b))
+                            todo.append((_Step.EVAL, env, p.type))
+                        case ast.FnType(p, b):
+                            todo.append((_Step.FN_TYPE, env, p.name, b))
+                            todo.append((_Step.EVAL, env, p.type))
+                        case ast.Univ():
+                            out.append(val.Univ())
+                        case ast.Nat():
+                            out.append(val.Nat())
+                        case ast.Lit(n):
+                            out.append(val.Lit(n))
+                        case ast.Prim(op):
+                            out.append(val.Prim(op))
+                        case _:
+                            raise AssertionError("impossible")
+                case (_Step.APP,):
+                    x = out.pop()
+                    out.append(self.apply(out.pop(), x))
+                case (_Step.FN, env, name, b):
+                    # 函数体暂不求值, 连同当前环境打包成闭包.
+                    p = core.Param[val.Value](name, out.pop())
+                    out.append(val.Fn(p, val.Closure(env, b)))
+                case (_Step.FN_TYPE, env, name, b):
+                    p = core.Param[val.Value](name, out.pop())
+                    out.append(val.FnType(p, val.Closure(env, b)))
+        return out.pop()
+
+    def ref(self, v: core.Var) -> val.Value:
+        """全局定义的引用, 先不展开, 等到需要时再展开."""
+        return val.Global(v, (), val.Lazy(lambda: self.glob(v).value))
+
+    def apply(self, f: val.Value, *args: val.Value) -> val.Value:
+        """函数调用, 即 beta reduction."""
         for x in args:
-            match ret:
-                case ast.Fn(p, b):
-                    ret = self.subst((p.name, x), b)
+            match f:
+                case val.Fn(_, b):
+                    f = self.inst(b, x)
+                case val.Neutral(lvl, v, spine):
+                    f = val.Neutral(lvl, v, spine + (x,))
+                case val.Global(v, spine, unfolded):
+                    f = val.Global(v, spine + (x,), self.lazy_apply(unfolded, x))
+                case val.Prim(op, spine):
+                    f = self.prim(op, spine + (x,))
                 case _:
-                    ret = ast.App(ret, x)
-        return ret
+                    raise AssertionError("impossible")
+        return f
+
+    def prim(self, op: str, spine: val.Spine) -> val.Value:
+        """内置运算 op 被应用到 spine 上, 两个参数都是字面量 (展开全局定义之后) 时直接计算."""
+        if len(spine) == 2:
+            match self.force(spine[0]), self.force(spine[1]):
+                case val.Lit(a), val.Lit(b):
+                    if self.fuel:
+                        self.fuel.step()
+                    return val.Lit(ast.PRIMS[op](a, b))
+        return val.Prim(op, spine)
+
+    def lazy_apply(self, f: val.Lazy, x: val.Value) -> val.Lazy:
+        """延迟的函数调用, 给 val.Global 展开使用."""
+        return val.Lazy(lambda: self.apply(f.force(), x))
+
+    @staticmethod
+    def force(v: val.Value) -> val.Value:
+        """展开最外层的全局定义, 直到得到 weak head normal form."""
+        while isinstance(v, val.Global):
+            v = v.unfolded.force()
+        return v
+
+    def demand(self, v: val.Value) -> val.Value:
+        """求值 thunk, 并把结果记到 thunk 中, 不是 thunk 的值原样返回. 这里的求值不会产生 thunk, 只有
+        call-by-need 的求值器会."""
+        while isinstance(v, val.Thunk):
+            if v.tm is not None:
+                v.v = self.eval(typing.cast(val.Env, v.env), v.tm)
+                v.env = v.tm = None
+            v = typing.cast(val.Value, v.v)
+        return v
+
+    def inst(self, c: val.Closure, x: val.Value) -> val.Value:
+        """即 instantiate, 将闭包的参数绑定为 x, 继续对函数体求值."""
+        if self.fuel:
+            self.fuel.step()
+        if c.code:
+            return c.code(c.env + (x,))
+        return self.eval(c.env + (x,), c.body)
+
+    def quote(self, lvl: val.Lvl, v: val.Value) -> ast.Term:
+        """在有 lvl 个局部变量的上下文中, 将语义值读回 (readback) 成 normal form.
+
+        和 eval 一样, 这里用 todo 栈代替递归."""
+        todo: typing.List[typing.Tuple] = [(_Step.QUOTE, lvl, v)]
+        out: typing.List[ast.Term] = []
+        fuel = self.fuel
+        while todo:
+            match todo.pop():
+                case (_Step.QUOTE, lvl, v):
+                    if fuel:
+                        fuel.node()
+                    match self.force(
+                        v
+                    ):  # 读回时要得到 normal form, 所以全局定义都要展开
+                        case val.Neutral(x, name, spine):
+                            # level 换算成 index, 再依次应用读回后的 spine.
+                            todo.append(
+                                (_Step.APP, len(spine), self.mk.idx(lvl - x - 1, name))
+                            )
+                            todo.extend((_Step.QUOTE, lvl, y) for y in reversed(spine))
+                        case val.Fn(p, b):
+                            self.quote_closure(todo, _Step.FN, lvl, p, b)
+                        case val.FnType(p, b):
+                            self.quote_closure(todo, _Step.FN_TYPE, lvl, p, b)
+                        case val.Prim(op, spine):
+                            # 和 neutral term 一样读回成一串函数应用.
+                            todo.append((_Step.APP, len(spine), self.mk.prim(op)))
+                            todo.extend((_Step.QUOTE, lvl, y) for y in reversed(spine))
+                        case val.Univ():
+                            out.append(self.mk.univ())
+                        case val.Nat():
+                            out.append(self.mk.nat())
+                        case val.Lit(n):
+                            out.append(self.mk.lit(n))
+                        case _:
+                            raise AssertionError("impossible")
+                case (_Step.APP, n, ret):
+                    args = out[len(out) - n :]
+                    del out[len(out) - n :]
+                    for x in args:
+                        ret = self.mk.app(ret, x)
+                    out.append(ret)
+                case (_Step.FN, name):
+                    b = out.pop()
+                    p = core.Param[ast.Term](name, out.pop())
+                    out.append(self.mk.fn(p, b))
+                case (_Step.FN_TYPE, name):
+                    b = out.pop()
+                    p = core.Param[ast.Term](name, out.pop())
+                    out.append(self.mk.fn_type(p, b))
+        return out.pop()
+
+    def quote_closure(
+        self,
+        todo: typing.List[typing.Tuple],
+        tag: _Step,
+        lvl: val.Lvl,
+        p: core.Param[val.Value],
+        c: val.Closure,
+    ):
+        """读回一个闭包: 先读回参数类型, 再用一个代表 level 为 lvl 的新变量作为参数调用它, 读回函数体."""
+        todo.append((tag, p.name))
+        todo.append((_Step.QUOTE, lvl + 1, self.inst(c, val.Neutral(lvl, p.name))))
+        todo.append((_Step.QUOTE, lvl, p.type))
+
+    def term(self, env: val.Env, tm: ast.Term) -> ast.Term:
+        """对单个值进行求值, 即先求值再读回."""
+        return self.quote(len(env), self.eval(env, tm))
 
 
 def to_value(d: core.Def[ast.Term]) -> ast.Term:
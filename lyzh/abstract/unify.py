@@ -2,38 +2,100 @@
 # Unifier
 
 相等检查器, 即执行 unification 算法, 又叫做 conversion checking.
+
+两边的值都只是 weak head normal form, 函数体仍然是闭包, 只有比较到它们时才会继续求值. 全局定义的引用
+(val.Global) 也先不展开: 如果两边是同一个定义被应用到相等的参数上, 那么它们一定相等; 只有比较失败时,
+才展开定义继续比较.
 """
 
 import dataclasses
+import typing
 
-import lyzh.abstract.data as ast
 import lyzh.abstract.normalize as normalize
+import lyzh.abstract.value as val
+import lyzh.core as core
 
 
 @dataclasses.dataclass
 class Unifier:
     """相等检查器."""
 
-    globals: ast.Globals
-
-    def unify(self, lhs: ast.Term, rhs: ast.Term) -> bool:
-        match lhs, rhs:
-            case ast.Ref(x), ast.Ref(y):
-                return x.text == y.text and x.id == y.id
-            case ast.App(f, x), ast.App(g, y):
-                return self.unify(f, g) and self.unify(x, y)
-            case ast.Fn(p, b), ast.Fn(q, c):
-                # 将 c 内部的 q 替换成 p 后和 b 检查是否相等.
-                return self.unify(
-                    b, normalize.Normalizer().subst((q.name, ast.Ref(p.name)), c)
-                )
-            case ast.FnType(p, b), ast.FnType(q, c):
-                if not self.unify(p.type, q.type):
-                    return False
-                # 将 c 内部的 q 替换成 p 后和 b 检查是否相等.
-                return self.unify(
-                    b, normalize.Normalizer().subst((q.name, ast.Ref(p.name)), c)
-                )
-            case ast.Univ(), ast.Univ():
-                return True
-        return False
+    normalizer: normalize.Normalizer
+    pairs: int = 0  # 一共比较过的值的对数
+    # 其中两边是同一个对象, 直接判定相等的对数. 值不会被 hash consing (见 ast.HashCons), 同一个对象来自
+    # 共享: 同一个局部变量, 环境中的同一个值, 或者同一个全局定义缓存的值.
+    same: int = 0
+
+    def unify(self, lvl: val.Lvl, lhs: val.Value, rhs: val.Value) -> bool:
+        """在有 lvl 个局部变量的上下文中检查两个值是否相等. 为了能处理非常深的值, 这里不使用递归,
+        而是把所有还需要检查的一对对值放到 todo 栈中, 它们全部相等时才相等."""
+        todo = [(lvl, lhs, rhs)]
+        fuel = self.normalizer.fuel
+        pairs = same = 0  # 比较过的值的对数, 以及其中两边是同一个对象的对数
+        try:
+            while todo:
+                lvl, lhs, rhs = todo.pop()
+                if fuel:
+                    fuel.tick()
+                pairs += 1
+                if lhs is rhs:  # 同一个对象, 不需要再比较结构
+                    same += 1
+                    continue
+                match lhs, rhs:
+                    case val.Neutral(x, _, xs), val.Neutral(y, _, ys):
+                        if x != y or len(xs) != len(ys):
+                            return False
+                        todo.extend((lvl, a, b) for a, b in zip(xs, ys))
+                    case val.Fn(p, b), val.Fn(_, c):
+                        # 用同一个新变量调用两边的函数体, 检查结果是否相等.
+                        todo.append(self.closures(lvl, p, b, c))
+                    case val.FnType(p, b), val.FnType(q, c):
+                        todo.append(self.closures(lvl, p, b, c))
+                        todo.append((lvl, p.type, q.type))
+                    case val.Univ(), val.Univ():
+                        pass
+                    case val.Nat(), val.Nat():
+                        pass
+                    case val.Lit(x), val.Lit(y):
+                        # 字面量直接比较整数, 不需要像 Church numeral 那样展开成函数再比较.
+                        if x != y:
+                            return False
+                    case val.Prim(x, xs), val.Prim(y, ys):
+                        if x != y or len(xs) != len(ys):
+                            return False
+                        todo.extend((lvl, a, b) for a, b in zip(xs, ys))
+                    # call-by-need 求值器产生的 thunk, 要比较时才求值.
+                    case val.Thunk(), _:
+                        todo.append((lvl, self.normalizer.demand(lhs), rhs))
+                    case _, val.Thunk():
+                        todo.append((lvl, lhs, self.normalizer.demand(rhs)))
+                    case val.Global(x, xs, _), val.Global(y, ys, _):
+                        # 比较参数失败时还要回退到展开定义, 所以这里单独检查一次.
+                        if (
+                            x.id == y.id
+                            and len(xs) == len(ys)
+                            and all(self.unify(lvl, a, b) for a, b in zip(xs, ys))
+                        ):
+                            continue
+                        # 先展开后定义的那个, 因为它有可能是用先定义的那个定义出来的.
+                        if x.id < y.id:
+                            todo.append((lvl, lhs, rhs.unfolded.force()))
+                        else:
+                            todo.append((lvl, lhs.unfolded.force(), rhs))
+                    case val.Global(_, _, unfolded), _:
+                        todo.append((lvl, unfolded.force(), rhs))
+                    case _, val.Global(_, _, unfolded):
+                        todo.append((lvl, lhs, unfolded.force()))
+                    case _:
+                        return False
+            return True
+        finally:
+            self.pairs += pairs
+            self.same += same
+
+    def closures(
+        self, lvl: val.Lvl, p: core.Param[val.Value], b: val.Closure, c: val.Closure
+    ) -> typing.Tuple[val.Lvl, val.Value, val.Value]:
+        """用同一个新变量调用两个闭包, 返回需要检查的一对函数体."""
+        x = val.Neutral(lvl, p.name)
+        return lvl + 1, self.normalizer.inst(b, x), self.normalizer.inst(c, x)
@@ -0,0 +1,141 @@
+"""\
+# Semantic domain
+
+语义域, 即求值 (evaluation) 的结果. 和 ast.Term 不同, 这里的函数体不会被立刻求值, 而是和定义它时的
+environment 一起打包成一个闭包 (closure), 直到它被调用时才继续求值. 而无法继续计算的表达式, 例如
+一个自由变量被调用, 则被表示成 neutral term, 即 "卡住" 的变量 (head) 加上它身上的一串参数 (spine).
+
+Normalization by evaluation 正是这样两步: 先把 ast.Term 求值成 Value, 再把 Value 读回 (readback,
+又叫 quote) 成 normal form 的 ast.Term.
+
+ast.Term 中的局部变量是 de Bruijn index (从内往外数), 而这里的变量是 de Bruijn level (从外往内数),
+level 的好处是值被带到更深的上下文中时不需要做任何调整, 只有读回的时候才换算回 index.
+"""
+
+import dataclasses
+import typing
+
+import lyzh.abstract.data as ast
+import lyzh.core as core
+
+
+@dataclasses.dataclass(slots=True)
+class Value: ...
+
+
+type Lvl = int
+"""de Bruijn level, 即变量是上下文中从外往内数的第几个."""
+
+type Env = typing.Tuple[Value, ...]
+"""求值环境, 第 i 个元素是 level 为 i 的变量的值, 所以 de Bruijn index i 对应 env[-1 - i].
+闭包会持有它, 所以它是不可变的 tuple."""
+
+type Spine = typing.Tuple[Value, ...]
+"""neutral term 身上累积的参数, 从左到右依次被应用."""
+
+
+type Code = typing.Callable[[Env], Value]
+"""编译好的函数体 (见 lyzh.abstract.jit), 在环境下直接构造出函数体的值."""
+
+
+@dataclasses.dataclass(slots=True)
+class Closure:
+    """闭包, 即尚未求值的函数体和它定义时的环境. 全局定义中的闭包还可能带着编译好的函数体, 这时 inst
+    直接调用它, 不再解释 body."""
+
+    env: Env
+    body: ast.Term
+    code: typing.Optional[Code] = None
+
+
+@dataclasses.dataclass(slots=True)
+class Neutral(Value):
+    """无法继续计算的值, 即 level 为 lvl 的变量被应用到了 spine 上."""
+
+    lvl: Lvl
+    v: core.Var  # 原来的名字, 仅用于打印
+    spine: Spine = ()
+
+
+@dataclasses.dataclass(slots=True, eq=False)
+class Thunk(Value):
+    """call-by-need 求值中还没有求值的参数, 即 tm 和它的环境 env (见 lyzh.abstract.machine.Need). 第一次
+    被用到时才求值, 结果记在 v 中, 同时丢掉 env 和 tm, 之后所有用到它的地方都共用这个结果."""
+
+    env: typing.Optional[Env]
+    tm: typing.Optional[ast.Term]
+    v: typing.Optional[Value] = None
+
+
+class Lazy:
+    """延迟计算的值, 第一次 force 时才计算, 之后直接返回缓存的结果."""
+
+    __slots__ = ("f", "v")
+
+    def __init__(self, f: typing.Callable[[], Value]):
+        self.f: typing.Optional[typing.Callable[[], Value]] = f
+        self.v: typing.Optional[Value] = None
+
+    def force(self) -> Value:
+        if self.f:
+            self.v = self.f()
+            self.f = None  # 计算完就不再需要了, 释放它捕获的变量
+        return self.v
+
+
+@dataclasses.dataclass(slots=True)
+class Global(Value):
+    """全局定义 v 被应用到了 spine 上. 和 Neutral 一样, 它先保持 "卡住" 的样子, 这样相等检查可以直接
+    比较名字和参数, 只有真正需要时才通过 unfolded 展开成定义的值, 学术里又叫做 glued evaluation."""
+
+    v: core.Var
+    spine: Spine
+    unfolded: Lazy = dataclasses.field(compare=False)
+
+
+@dataclasses.dataclass(slots=True)
+class Univ(Value):
+    """类型宇宙."""
+
+
+@dataclasses.dataclass(slots=True)
+class Nat(Value):
+    """内置的自然数类型."""
+
+
+@dataclasses.dataclass(slots=True)
+class Lit(Value):
+    """自然数字面量."""
+
+    n: int
+
+
+@dataclasses.dataclass(slots=True)
+class Prim(Value):
+    """内置的自然数运算 op 被应用到了 spine 上. 参数凑齐两个并且都是字面量时就直接算出结果, 否则它和
+    Neutral 一样卡住."""
+
+    op: str
+    spine: Spine = ()
+
+
+@dataclasses.dataclass(slots=True)
+class FnType(Value):
+    """函数类型, 参数类型已经求值, 返回类型是闭包."""
+
+    p: core.Param[Value]
+    body: Closure
+
+
+@dataclasses.dataclass(slots=True)
+class Fn(Value):
+    """函数, 参数类型已经求值, 函数体是闭包."""
+
+    p: core.Param[Value]
+    body: Closure
+
+
+type Locals = typing.Dict[core.ID, typing.Tuple[Lvl, Value]]
+"""本地变量定义, 在学术中叫做 Gamma, Γ (对, 论文里最常出现的那个), 其实就是 local context,
+它将变量 ID 映射到变量的 level 和它的类型, 注意这里的值只能是该变量的类型 (type value), 不能是一个值
+(value term)."""
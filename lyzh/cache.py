@@ -0,0 +1,127 @@
+"""\
+# Cache
+
+检查结果的磁盘缓存, 这样命令行每次运行时, 没有变化的定义可以直接从缓存中读取, 而不必重新检查.
+
+缓存的键是定义的源码和它引用的所有全局定义的键的哈希值 (见 lyzh.driver), 所以一个定义或它直接或间接
+依赖的定义发生任何变化, 键都会随之改变. 值是 lyzh.abstract.binary 格式的检查结果.
+
+模块的接口文件 (见 lyzh.driver) 也放在这里, 格式是文件头, 模块的键 (同样是 32 字节), CRC32 校验和以及
+模块导出的定义.
+
+缓存文件的格式是文件头加上一串条目, 每个条目是 32 字节的键, 值的长度, 值的 CRC32 校验和以及值本身.
+校验和不对的条目会被丢弃, 损坏的缓存最多导致重新检查, 而不会读出错误的结果.
+"""
+
+import os
+import typing
+import zlib
+
+_MAGIC = b"LYZH\x02"  # 格式变化时修改版本号, 旧的缓存就会被忽略
+_INTERFACE_MAGIC = b"LYZI\x01"
+_KEY = 32
+
+
+def path_for(file: str) -> str:
+    """源文件对应的缓存文件, 和 Python 的 __pycache__ 一样放在源文件旁边."""
+    head, tail = os.path.split(file)
+    return os.path.join(head, "__lyzhcache__", tail + ".bin")
+
+
+def interface_for(file: str) -> str:
+    """源文件对应的接口文件."""
+    head, tail = os.path.split(file)
+    return os.path.join(head, "__lyzhcache__", tail + ".iface")
+
+
+def read_interface(file: str, key: bytes) -> typing.Optional[bytes]:
+    """读取源文件对应的接口文件, 只有接口文件是由键为 key 的模块生成的时候才返回它的内容."""
+    head = _INTERFACE_MAGIC + key
+    try:
+        with open(interface_for(file), "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if not data.startswith(head):
+        return None
+    crc = int.from_bytes(data[len(head) : len(head) + 4], "little")
+    data = data[len(head) + 4 :]
+    return data if zlib.crc32(data) == crc else None
+
+
+def write_interface(file: str, key: bytes, data: bytes):
+    crc = zlib.crc32(data).to_bytes(4, "little")
+    write(interface_for(file), _INTERFACE_MAGIC + key + crc + data)
+
+
+def write(path: str, data: bytes):
+    """先写到临时文件再替换, 这样同时运行的其他进程不会读到写了一半的文件."""
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # 缓存只是锦上添花, 写不了就算了
+
+
+class Store:
+    """一个缓存文件的内容."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: typing.Dict[bytes, bytes] = {}
+        self.changed = False
+        try:
+            with open(path, "rb") as f:
+                self.entries = parse(f.read())
+        except (OSError, ValueError):
+            pass  # 没有缓存或者缓存损坏, 都当作空的缓存
+
+    def get(self, key: bytes) -> typing.Optional[bytes]:
+        return self.entries.get(key)
+
+    def put(self, key: bytes, data: bytes):
+        self.entries[key] = data
+        self.changed = True
+
+    def save(self, keys: typing.Optional[typing.Iterable[bytes]] = None):
+        """只保留 keys 对应的条目并写回文件, 过时的条目就被丢掉了. keys 为 None 时保留所有条目, 只写入
+        新的条目."""
+        if keys is None:
+            entries = self.entries
+        else:
+            entries = {k: self.entries[k] for k in keys if k in self.entries}
+        if not self.changed and len(entries) == len(self.entries):
+            return
+        self.entries = entries
+        self.changed = False
+        out = bytearray(_MAGIC)
+        for key, data in entries.items():
+            out += key
+            out += len(data).to_bytes(4, "little")
+            out += zlib.crc32(data).to_bytes(4, "little")
+            out += data
+        write(self.path, bytes(out))
+
+
+def parse(data: bytes) -> typing.Dict[bytes, bytes]:
+    """解析缓存文件."""
+    if not data.startswith(_MAGIC):
+        raise ValueError("bad magic")
+    entries = {}
+    pos = len(_MAGIC)
+    while pos < len(data):
+        key = data[pos : pos + _KEY]
+        pos += _KEY
+        n = int.from_bytes(data[pos : pos + 4], "little")
+        crc = int.from_bytes(data[pos + 4 : pos + 8], "little")
+        pos += 8
+        if pos + n > len(data):
+            raise ValueError("truncated")
+        value = data[pos : pos + n]
+        pos += n
+        if zlib.crc32(value) == crc:
+            entries[key] = value
+    return entries
@@ -5,18 +5,19 @@
 """
 
 import dataclasses
+import typing
 
 import lyzh.core as core
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Expr:
     """表达式父类."""
 
     loc: core.Loc
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Fn(Expr):
     """Function, 函数表达式, 也就是 lambda 表达式."""
 
@@ -24,7 +25,7 @@ class Fn(Expr):
     body: Expr
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class App(Expr):
     """Function application, 函数应用表达式."""
 
@@ -32,7 +33,7 @@ class App(Expr):
     x: Expr
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class FnType(Expr):
     """Function type, 函数类型表达式, 也就是学术里的 Pi type 和 dependent function type."""
 
@@ -41,19 +42,54 @@ class FnType(Expr):
 
 
 # Universe, 类型宇宙表达式, 也就是学术里的 type of type, 类型的类型.
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Univ(Expr): ...
 
 
-@dataclasses.dataclass
+# 内置的自然数类型, 即 Nat.
+@dataclasses.dataclass(slots=True)
+class Nat(Expr): ...
+
+
+@dataclasses.dataclass(slots=True)
+class Lit(Expr):
+    """自然数字面量."""
+
+    n: int
+
+
+@dataclasses.dataclass(slots=True)
+class Prim(Expr):
+    """内置的自然数运算, 即 Add 和 Mul."""
+
+    op: str
+
+
+@dataclasses.dataclass(slots=True)
 class Unresolved(Expr):
     """未进行作用域检查的变量引用表达式."""
 
     v: core.Var
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Resolved(Expr):
     """通过作用域检查后的变量引用表达式."""
 
     v: core.Var
+
+
+@dataclasses.dataclass
+class Import:
+    """导入同一目录下另一个模块 (即另一个文件) 的所有定义, 模块名就是去掉 .lyzh 后缀的文件名."""
+
+    loc: core.Loc
+    name: core.Var
+
+
+@dataclasses.dataclass
+class Module:
+    """一个文件, 即开头的所有导入和之后的所有定义."""
+
+    imports: typing.List[Import]
+    defs: core.Defs[Expr]
@@ -7,26 +7,77 @@ pruning 和 first-class polymorphism (总之就是猜类型猜的更智能) 等,
 AndrasKovacs/elaboration-zoo.
 """
 
+import contextlib
 import dataclasses
 import typing
 
 import lyzh.core as core
 import lyzh.concrete.data as cst
 import lyzh.abstract.data as ast
+import lyzh.abstract.machine as machine
 import lyzh.abstract.normalize as normalize
 import lyzh.abstract.unify as unify
-from lyzh.abstract.rename import rename
+import lyzh.abstract.value as val
 
 
-class Error(Exception): ...
+class Error(core.Error): ...
+
+
+class OutOfBudget(Error):
+    """检查一个定义 (或者一个单独的表达式, 这时 name 为 None) 时用完了预算中的资源 resource, 见
+    lyzh.abstract.normalize.Budget."""
+
+    def __init__(
+        self, loc: core.Loc, name: typing.Optional[str], resource: str, limit: float
+    ):
+        what = f"definition '{name}'" if name else "expression"
+        super().__init__(loc, f"{what} exceeded the {resource} budget ({limit})")
+        # 并行检查时错误要在进程之间传递, unpickle 时会用 args 重新调用 __init__.
+        self.args = (loc, name, resource, limit)
+        self.name = name
+        self.resource = resource
+        self.limit = limit
+
+
+BACKENDS: typing.Dict[str, typing.Type[normalize.Normalizer]] = {
+    "nbe": normalize.Normalizer,
+    "machine": machine.Machine,
+    "need": machine.Need,
+}
+"""可选的求值器实现, 它们的接口和结果都完全相同, 只是求值的方式不同."""
+
+# 内置运算的类型, 即 (a: Nat) -> (b: Nat) -> Nat.
+_PRIM_TYPE = ast.FnType(
+    core.Param(core.Var("a"), ast.Nat()),
+    ast.FnType(core.Param(core.Var("b"), ast.Nat()), ast.Nat()),
+)
 
 
 @dataclasses.dataclass
 class Elaborator:
-    """类型检查器."""
+    """类型检查器, 它把带名字的 cst.Expr 降级 (lower) 成用 de Bruijn index 表示的 ast.Term."""
 
     globals: ast.Globals = dataclasses.field(default_factory=dict)
-    locals: ast.Locals = dataclasses.field(default_factory=dict)
+    # 分配变量 ID 的会话, globals 以 ID 为键, 所以解析和读取缓存时都要用同一个会话分配 ID.
+    session: core.Session = dataclasses.field(default_factory=core.Session)
+    locals: val.Locals = dataclasses.field(default_factory=dict)
+    env: val.Env = ()  # 局部变量的值, 也就是代表它们自身的 neutral 变量
+    # 构造 ast.Term 的工厂.
+    mk: ast.Builder = dataclasses.field(default_factory=ast.Builder)
+    backend: str = "nbe"  # 求值器的实现, 见 BACKENDS
+    jit: bool = False  # 是否把全局定义编译成 Python 函数, 见 lyzh.abstract.jit
+    # 检查每个定义时求值可以使用的资源, 为 None 时不限制.
+    budget: typing.Optional[normalize.Budget] = None
+    normalizer: normalize.Normalizer = dataclasses.field(init=False)
+    unifier: unify.Unifier = dataclasses.field(init=False)
+
+    def __post_init__(self):
+        # 整个检查过程共用同一个求值器, 全局定义的求值缓存也就能一直复用下去.
+        fuel = normalize.Fuel(self.budget) if self.budget else None
+        self.normalizer = BACKENDS[self.backend](
+            self.globals, self.mk, jit=self.jit, fuel=fuel
+        )
+        self.unifier = unify.Unifier(self.normalizer)
 
     def elaborate(self, ds: core.Defs[cst.Expr]) -> core.Defs[ast.Term]:
         """检查所有定义的类型."""
@@ -34,22 +85,68 @@ class Elaborator:
 
     def elaborate_def(self, d: core.Def[cst.Expr]) -> core.Def[ast.Term]:
         """检查单个定义的类型."""
-        checked = []  # 已经检查过的局部变量
-        ps = []  # 已经检查过的函数参数
-        for p in d.params:
-            typ = self.check(p.type, ast.Univ())
-            ps.append(core.Param[ast.Term](p.name, typ))
-            self.locals[p.name.id] = typ  # 加入到局部变量中
-            checked.append(p.name.id)
-        ret = self.check(d.ret, ast.Univ())  # 返回类型一定是 type 类型
-        body = self.check(d.body, ret)  # 函数体的表达式是 ret 类型
-        for v in checked:  # 清空局部变量, 下一个定义的检查用不到了
-            del self.locals[v]
-        checked_def = core.Def[ast.Term](d.loc, d.name, ps, ret, body)
-        self.globals[d.name.id] = checked_def  # 将此定义加入到全局中
+        try:
+            with self.budgeted(d.loc, d.name.text):
+                ps = []  # 已经检查过的函数参数
+                nf_ps = []  # 同上, 但参数类型是 normal form
+                for p in d.params:
+                    typ = self.check(p.type, val.Univ())
+                    ps.append(core.Param[ast.Term](p.name, typ))
+                    nf_ps.append(core.Param[ast.Term](p.name, self.nf(typ)))
+                    self.bind(p.name, self.eval(typ))  # 加入到局部变量中
+                ret = self.check(d.ret, val.Univ())  # 返回类型一定是 type 类型
+                body = self.check(d.body, self.eval(ret))  # 函数体的表达式是 ret 类型
+                # 计算出 normal form 作为结果.
+                checked_def = core.Def[ast.Term](
+                    d.loc, d.name, nf_ps, self.nf(ret), self.nf(body)
+                )
+        except Error:
+            # 检查失败时也要清空局部变量, 这样这个类型检查器还能继续检查其他定义.
+            self.reset()
+            raise
+        except RecursionError:
+            # check 和 infer 是递归的, 表达式嵌套太深时会超出 Python 的递归深度.
+            self.reset()
+            raise Error(d.loc, f"definition '{d.name.text}' is nested too deeply")
+        for p in reversed(d.params):  # 清空局部变量, 下一个定义的检查用不到了
+            self.unbind(p.name)
+        # 将此定义加入到全局中, 注意这里保存的参数类型和返回类型不是 normal form, 其中对其他全局定义的
+        # 引用都还没有展开, 这样后续的相等检查可以先比较这些引用的名字, 而不必把它们展开. 函数体则保存
+        # normal form, 这样展开这个定义时不需要再重新计算一遍.
+        self.globals[d.name.id] = core.Def[ast.Term](
+            d.loc, d.name, ps, ret, checked_def.body
+        )
         return checked_def
 
-    def check(self, e: cst.Expr, typ: ast.Term) -> ast.Term:
+    def elaborate_expr(self, e: cst.Expr) -> typing.Tuple[ast.Term, val.Value]:
+        """在全局定义的上下文中推导单独一个表达式的类型, 例如交互式的查询."""
+        try:
+            with self.budgeted(e.loc):
+                return self.infer(e)
+        except Error:
+            self.reset()
+            raise
+        except RecursionError:
+            self.reset()
+            raise Error(e.loc, "expression is nested too deeply")
+
+    @contextlib.contextmanager
+    def budgeted(self, loc: core.Loc, name: typing.Optional[str] = None):
+        """在重新装满的预算下检查 loc 处的定义 name (为 None 时是一个表达式), 或者计算它的值, 例如
+        求出表达式的 normal form. 预算用完时抛出 OutOfBudget."""
+        if self.normalizer.fuel:
+            self.normalizer.fuel.refill()
+        try:
+            yield
+        except normalize.Exhausted as x:
+            raise OutOfBudget(loc, name, x.resource, x.limit)
+
+    def reset(self):
+        """清空局部变量."""
+        self.locals.clear()
+        self.env = ()
+
+    def check(self, e: cst.Expr, typ: val.Value) -> ast.Term:
         """进行类型检查."""
         match e:
             # 只需要检查函数类型, 因为信息是足够的.
@@ -57,43 +154,42 @@ class Elaborator:
                 #        Γ , x : A ⊢ M : B
                 # --------------------------------- function introduction rule
                 # Γ ⊢ λ (x : A) → M : π (x : A) → B
-                match normalize.Normalizer().term(typ):
-                    case ast.FnType(p, b):
-                        body_type = normalize.Normalizer().subst(
-                            (p.name, ast.Ref(v)), b
-                        )
-                        param = core.Param[ast.Term](v, p.type)
-                        return ast.Fn(param, self.guarded_check(param, body, body_type))
+                match self.normalizer.force(typ):
+                    case val.FnType(p, b):
+                        param = core.Param[ast.Term](v, self.quote(p.type))
+                        x = self.bind(v, p.type)
+                        body_tm = self.check(body, self.normalizer.inst(b, x))
+                        self.unbind(v)
+                        return self.mk.fn(param, body_tm)
                     case typ:
-                        raise Error(f"{loc}: expected '{typ}', got function type")
+                        raise Error(
+                            loc, f"expected '{self.quote(typ)}', got function type"
+                        )
             # 其余的表达式进行类型推导, 用推导的类型和期盼的类型判断是否一致.
             case _:
                 tm, got = self.infer(e)
-                got = normalize.Normalizer().term(got)
-                typ = normalize.Normalizer().term(typ)
                 if self.unify(got, typ):  # 一致性检查
                     return tm
-                raise Error(f"{e.loc}: expected '{typ}', got '{got}'")
+                raise Error(
+                    e.loc, f"expected '{self.quote(typ)}', got '{self.quote(got)}'"
+                )
 
-    def infer(self, e: cst.Expr) -> typing.Tuple[ast.Term, ast.Term]:
+    def infer(self, e: cst.Expr) -> typing.Tuple[ast.Term, val.Value]:
         """类型推导, 其中内部也会调用 check, 所以才叫做 bidirectional typechecking,
         双向类型检查, 类型检查和类型推导是一对 mutual recursion (互相调用)."""
         match e:
             case cst.Resolved(_, v):
                 # Γ ⊢ v : A
                 try:
-                    # 尝试从本地变量中找对应的类型.
-                    return ast.Ref(v), self.locals[v.id]
+                    # 尝试从本地变量中找对应的类型, 并将 level 换算成 index.
+                    lvl, typ = self.locals[v.id]
+                    return self.mk.idx(len(self.env) - lvl - 1, v), typ
                 except KeyError:
                     pass  # 找不到没关系
                 try:
-                    # 继续从全局中找.
-                    d = self.globals[v.id]
-                    return (
-                        # 将全局定义转换成对应的值和类型, 并且刷新内部的变量引用.
-                        rename(normalize.to_value(d)),
-                        rename(normalize.to_type(d)),
-                    )
+                    # 继续从全局中找, 全局定义是封闭的, 引用它不需要刷新内部的变量,
+                    # 它的类型也只会在第一次引用时求值.
+                    return self.mk.ref(v), self.normalizer.glob(v).type
                 except KeyError:
                     # 由于提前做过作用域检查, 所以不可能在本地和全局都不存在.
                     raise AssertionError("impossible")
@@ -102,49 +198,70 @@ class Elaborator:
                 # -------------------------- function type introduction rule
                 # Γ ⊢ π (A: type) → M : type
                 p_typ = self.check(
-                    p.type, ast.Univ()
+                    p.type, val.Univ()
                 )  # 参数类型的类型一定是 Univ, 但我们仍需要确保这一点
                 inferred_p = core.Param[ast.Term](p.name, p_typ)
                 # 在参数 p 的保护下, 检查 body 的类型.
-                b_tm = self.guarded_check(inferred_p, b, ast.Univ())
+                self.bind(p.name, self.eval(p_typ))
+                b_tm = self.check(b, val.Univ())
+                self.unbind(p.name)
                 # 重新拼回去组成一个 ast.FnType.
-                return ast.FnType(inferred_p, b_tm), ast.Univ()
+                return self.mk.fn_type(inferred_p, b_tm), val.Univ()
             case cst.App(_, f, x):
                 # Γ ⊢ f : π (x : A) → B    x : A
                 # ------------------------------ function elimination rule
                 #          Γ ⊢ f x : B
                 f_tm, f_typ = self.infer(f)  # 先推导出 f 的类型
-                match f_typ:
-                    # f 的类型必须是 ast.FnType.
-                    case ast.FnType(p, b):
-                        # 在参数 p 的保护下检查参数 x 的类型必须是函数的参数 p 的类型.
-                        x_tm = self.guarded_check(p, x, p.type)
+                match self.normalizer.force(f_typ):
+                    # f 的类型必须是函数类型.
+                    case val.FnType(p, b):
+                        # 检查参数 x 的类型必须是函数的参数 p 的类型.
+                        x_tm = self.check(x, p.type)
                         # 表达式的类型即 b, 但是要将 b 内的 p 替换成 x.
-                        typ = normalize.Normalizer().subst((p.name, x_tm), b)
-                        # 尝试对表达式进行计算.
-                        tm = normalize.Normalizer().apply(f_tm, x_tm)
-                        return tm, typ
+                        typ = self.normalizer.inst(b, self.eval(x_tm))
+                        return self.mk.app(f_tm, x_tm), typ
                     case typ:
-                        raise Error(f"{f.loc}: expected function type, got '{typ}'")
+                        raise Error(
+                            f.loc, f"expected function type, got '{self.quote(typ)}'"
+                        )
             case cst.Univ(_):
                 # Γ ⊢ U type
                 # ---------- universe introduction rule
                 # Γ ⊢ U : U
-                return ast.Univ(), ast.Univ()
+                return self.mk.univ(), val.Univ()
+            case cst.Nat(_):
+                return self.mk.nat(), val.Univ()
+            case cst.Lit(_, n):
+                return self.mk.lit(n), val.Nat()
+            case cst.Prim(_, op):
+                return self.mk.prim(op), self.eval(_PRIM_TYPE)
         raise AssertionError("impossible")
 
-    def guarded_check(
-        self, p: core.Param[ast.Term], e: cst.Expr, typ: ast.Term
-    ) -> ast.Term:
-        """在 p 的保护下 (即将 p 加入到本地变量中, 检查完毕后删除), 检查表达式 e 的类型是否为 typ."""
-        self.locals[p.name.id] = p.type
-        ret = self.check(e, typ)
-        try:
-            del self.locals[p.name.id]
-        except KeyError:
-            pass
-        return ret
+    def bind(self, v: core.Var, typ: val.Value) -> val.Value:
+        """将类型为 typ 的变量 v 加入到本地变量中, 返回代表它的 neutral 变量."""
+        lvl = len(self.env)
+        x = val.Neutral(lvl, v)
+        self.locals[v.id] = (lvl, typ)
+        self.env += (x,)
+        return x
+
+    def unbind(self, v: core.Var):
+        """将最后加入的变量 v 从本地变量中删除."""
+        del self.locals[v.id]
+        self.env = self.env[:-1]
+
+    def eval(self, tm: ast.Term) -> val.Value:
+        """在当前的局部变量下求值."""
+        return self.normalizer.eval(self.env, tm)
+
+    def quote(self, v: val.Value) -> ast.Term:
+        """在当前的局部变量下读回."""
+        return self.normalizer.quote(len(self.env), v)
+
+    def nf(self, tm: ast.Term) -> ast.Term:
+        """在当前的局部变量下计算 normal form."""
+        return self.normalizer.term(self.env, tm)
 
-    def unify(self, lhs: ast.Term, rhs: ast.Term) -> bool:
+    def unify(self, lhs: val.Value, rhs: val.Value) -> bool:
         """检查两个值是否相等."""
-        return unify.Unifier(self.globals).unify(lhs, rhs)
+        return self.unifier.unify(len(self.env), lhs, rhs)
@@ -11,7 +11,7 @@ import lyzh.concrete.data as cst
 import lyzh.core as core
 
 
-class Error(Exception): ...
+class Error(core.Error): ...
 
 
 @dataclasses.dataclass
@@ -27,22 +27,42 @@ class Resolver:
         """检查所有定义的作用域."""
         return [self.resolve_def(d) for d in defs]
 
+    def resolve_top_expr(self, e: cst.Expr) -> cst.Expr:
+        """检查单独一个表达式的作用域, 例如交互式的查询."""
+        try:
+            return self.resolve_expr(e)
+        except RecursionError:
+            raise Error(e.loc, "expression is nested too deeply")
+
+    def declare(self, loc: core.Loc, v: core.Var):
+        """声明一个从其他模块导入的全局定义 v, loc 是导入的位置. 同一个定义可以被导入多次."""
+        if self.m.get(v.text) is v:
+            return
+        if v.text in self.names:
+            raise Error(loc, f"duplicate name '{v.text}'")
+        self.names.add(v.text)
+        self.insert(v)
+
     def resolve_def(self, d: core.Def[cst.Expr]) -> core.Def[cst.Expr]:
         """检查单个定义的作用域."""
         shadowed = []  # 被覆盖 (shadowed) 的变量, 需要在检查作用域后恢复
         fresh = []  # 没有被覆盖的全新的变量, 需要在检查作用域后删除
 
         params = []  # 检查完毕的参数列表
-        for p in d.params:
-            old = self.insert(p.name)
-            if old:
-                shadowed.append(old)
-            else:
-                fresh.append(p.name)
-            params.append(core.Param[cst.Expr](p.name, self.resolve_expr(p.type)))
-
-        ret = self.resolve_expr(d.ret)
-        body = self.resolve_expr(d.body)
+        try:
+            for p in d.params:
+                old = self.insert(p.name)
+                if old:
+                    shadowed.append(old)
+                else:
+                    fresh.append(p.name)
+                params.append(core.Param[cst.Expr](p.name, self.resolve_expr(p.type)))
+
+            ret = self.resolve_expr(d.ret)
+            body = self.resolve_expr(d.body)
+        except RecursionError:
+            # resolve_expr 是递归的, 表达式嵌套太深时会超出 Python 的递归深度.
+            raise Error(d.loc, f"definition '{d.name.text}' is nested too deeply")
 
         for v in fresh:  # 删除没有被覆盖的全新变量
             del self.m[v.text]
@@ -51,7 +71,7 @@ class Resolver:
 
         # 简单检查定义是否重名.
         if d.name.text in self.names:
-            raise Error(f"{d.loc}: duplicate name '{d.name.text}'")
+            raise Error(d.loc, f"duplicate name '{d.name.text}'")
         self.names.add(d.name.text)
 
         # 插入新的定义, 后续定义可以引用这个全局定义.
@@ -67,7 +87,7 @@ class Resolver:
                     # 检查在上下文中是否有 v 这个变量定义.
                     return cst.Resolved(loc, self.m[v.text])
                 except KeyError:
-                    raise Error(f"{loc}: unresolved variable '{v.text}'")
+                    raise Error(loc, f"unresolved variable '{v.text}'")
             case cst.Fn(loc, v, body):
                 # body 中能够引用变量 v.
                 b = self.guard(v, body)
@@ -79,7 +99,7 @@ class Resolver:
                 # body 中能够引用变量 p.name.
                 b = self.guard(p.name, body)
                 return cst.FnType(loc, core.Param(p.name, typ), b)
-            case cst.Univ(_):
+            case cst.Univ(_) | cst.Nat(_) | cst.Lit() | cst.Prim():
                 return e
         raise AssertionError("impossible")
 
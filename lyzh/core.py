@@ -4,41 +4,77 @@
 核心定义, 一些所有语法层级都使用得到的实用类.
 """
 
+import bisect
 import dataclasses
+import decimal
+import re
 import typing
 
+type Loc = int
+"""Source location, 源代码位置, 用于定位错误. 这里只记录它在源码中的偏移量, 只有在报告错误时才通过
+Lines 转换成行号和列号, 这样解析时不需要逐个字符地维护行号和列号, 每个语法节点也只需要存一个整数."""
+
 
 @dataclasses.dataclass
-class Loc:
-    """Source location, 源代码位置, 用于定位错误."""
+class Lines:
+    """源码中每一行的起始位置, 用于将 Loc 转换成行号和列号."""
 
-    pos: int = 0  # position
-    ln: int = 1  # line
-    col: int = 1  # column
+    starts: typing.List[int]
 
-    def __str__(self):
-        return f"{self.ln}:{self.col}"
+    @classmethod
+    def index(cls, src: str) -> typing.Self:
+        """为源码 src 建立索引."""
+        return cls([0] + [m.end() for m in re.finditer("\n", src)])
+
+    def show(self, loc: Loc) -> str:
+        """通过二分查找得到 loc 所在的行, 显示成 `行号:列号` 的形式."""
+        ln = bisect.bisect_right(self.starts, loc)
+        return f"{ln}:{loc - self.starts[ln - 1] + 1}"
+
+
+# Python 默认只允许 4300 位以内的整数和十进制字符串互相转换 (见 sys.set_int_max_str_digits), 这个限制
+# 最低也是 640 位, 而自然数字面量可以任意大. decimal 的转换不受这个限制, 所以位数更多时改用它.
+_SAFE_DIGITS = 640
+_SAFE_BITS = 2000  # 不超过 640 位十进制数字
+
+
+def read_nat(text: str) -> int:
+    """把十进制数字 text 转换成整数."""
+    if len(text) <= _SAFE_DIGITS:
+        return int(text)
+    return int(decimal.Decimal(text))
+
+
+def show_nat(n: int) -> str:
+    """把自然数 n 转换成十进制数字."""
+    if n.bit_length() <= _SAFE_BITS:
+        return str(n)
+    return str(decimal.Decimal(n))
 
-    def next_line(self):
-        """前进新的一行."""
-        self.pos += 1
-        self.ln += 1
-        self.col = 1
 
-    def next_column(self):
-        """前进新的一列."""
-        self.pos += 1
-        self.col += 1
+class Error(Exception):
+    """带有源代码位置的错误, 各个阶段的错误都继承它."""
+
+    def __init__(self, loc: Loc, msg: str):
+        super().__init__(loc, msg)
+        self.loc = loc
+        self.msg = msg
+
+    def __str__(self):
+        return self.msg
+
+    def render(self, lines: Lines) -> str:
+        """显示错误信息, 包括行号和列号."""
+        return f"{lines.show(self.loc)}: {self.msg}"
 
 
 type ID = int
-"""变量的 ID. 后续用到的技术叫做 capture-avoiding substitution. 和 de Bruijn index 与
-de Bruijn level 不同的是, 这两个概念实际上是 local context (存放本地变量) 和 global
-context (存放全局变量) 的变量索引. 那么我们可以使用一个全局唯一的 ID, 这样我们不需要在 local
-和 global context 发生变动的时候 (如新增了一个变量定义) 去修改表达式内所有变量的引用."""
+"""变量的 ID. 解析时每个名字都会从 Session 拿到一个唯一的 ID, 作用域检查之后, 引用会指向定义它的那个变量,
+所以在 concrete syntax 中可以直接用 ID 区分同名的不同变量. 到了 abstract syntax, 局部变量改用
+de Bruijn index 表示 (见 lyzh.abstract.data), ID 只剩下查找全局定义这一个用途了."""
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Var:
     """变量, 包含变量的原文以及它的 ID."""
 
@@ -49,16 +85,20 @@ class Var:
         return self.text
 
 
-_NEXT_ID = 0
+@dataclasses.dataclass
+class Session:
+    """一次检查会话, 负责分配变量 ID. ID 只需要在同一个会话中唯一 (全局定义就是以 ID 为键保存的), 所以
+    每个会话各自计数, 没有任何共享的状态: 多个会话可以在不同的线程中同时运行, 会话用完之后计数也随之
+    回收."""
 
+    last: ID = 0  # 上一个分配的 ID, 0 留给没有 ID 的变量
 
-def fresh() -> ID:
-    global _NEXT_ID
-    _NEXT_ID += 1
-    return _NEXT_ID
+    def fresh(self) -> ID:
+        self.last += 1
+        return self.last
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Param[T]:
     """参数定义, 即变量和它的类型."""
 
@@ -87,7 +127,7 @@ myStar = stargaze 1 1 4
 """
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class Def[T]:
     """即 definition, 一个函数定义.
 
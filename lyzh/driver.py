@@ -0,0 +1,506 @@
+"""\
+# Driver
+
+检查驱动, 把解析, 作用域检查和类型检查串起来.
+
+每个定义都有一个键, 即它的源码 (以及检查时的预算) 和它引用的所有全局定义的键的哈希值, 所以键不变就
+说明这个定义和它直接或间接依赖的定义都没有变化, 上一次的检查结果仍然有效. Driver 会记住每个定义上一次
+的检查结果, 同一个 Driver 再次检查修改过的源码时, 只有键发生了变化的定义才会被重新检查. 如果还提供了
+磁盘缓存 (见 lyzh.cache), 那么重新检查之前还会先按键从缓存中读取.
+
+一个文件就是一个模块, 它可以导入同一目录下的其他模块. 每个模块检查完之后都会生成一个接口文件, 保存它
+导出的所有定义 (即它们保存在全局中的版本), 导入它的模块只要读取接口文件就行了, 不需要重新检查它. 模块
+也有一个键, 即它的源码和它导入的所有模块的键的哈希值, 接口文件只有在键相同的时候才会被使用.
+
+需要重新检查的定义还可以并行检查: 定义之间的引用关系是一个有向无环图, 一个定义引用的定义都检查完之后,
+它就可以交给工作进程检查了, 同时带上它直接或间接引用的所有全局定义.
+"""
+
+import collections
+import concurrent.futures as futures
+import contextlib
+import dataclasses
+import hashlib
+import os
+import time
+import typing
+
+import lyzh.abstract.binary as binary
+import lyzh.abstract.data as ast
+import lyzh.abstract.normalize as normalize
+import lyzh.cache as cache
+import lyzh.concrete.data as cst
+import lyzh.concrete.elab as elab
+import lyzh.concrete.resolve as resolve
+import lyzh.core as core
+import lyzh.stats as stats
+import lyzh.surface.parser as parser
+
+
+class Error(core.Error): ...
+
+
+@dataclasses.dataclass
+class Module:
+    """检查过的模块."""
+
+    key: bytes
+    exports: typing.Dict[str, core.Var]  # 模块中定义的全局定义
+
+
+@dataclasses.dataclass
+class Entry:
+    """一个定义上一次的检查结果."""
+
+    key: bytes
+    d: typing.Optional[core.Def[ast.Term]]  # 不保留检查结果时为 None, 只记住键
+
+
+@dataclasses.dataclass
+class Driver:
+    """增量检查驱动."""
+
+    elaborator: elab.Elaborator = dataclasses.field(default_factory=elab.Elaborator)
+    store: typing.Optional[cache.Store] = None  # 磁盘缓存
+    loader: typing.Optional["Loader"] = None  # 默认和同一个类型检查器一起新建
+    jobs: int = 1  # 并行检查的进程数, 1 则在当前进程中逐个检查
+    # 是否保留每个定义的检查结果, 供同一个 Driver 的下一次检查复用. 只检查一次时可以关掉, 这样
+    # stream 产出的定义用完就可以释放.
+    keep: bool = True
+    # 统计信息, 其中 import 阶段包括了检查被导入的模块的时间.
+    stats: typing.Optional["stats.Stats"] = None
+    # 全局定义的名字到 ID 的映射, 多次检查之间同名定义的 ID 保持不变, 这样复用的检查结果中对它们的引用
+    # (ast.Ref) 仍然有效.
+    ids: typing.Dict[str, core.ID] = dataclasses.field(default_factory=dict)
+    entries: typing.Dict[str, Entry] = dataclasses.field(default_factory=dict)
+    # 上一次检查中重新检查的定义和从缓存读取的定义.
+    rechecked: typing.List[str] = dataclasses.field(default_factory=list)
+    loaded: typing.List[str] = dataclasses.field(default_factory=list)
+    module: typing.Optional[Module] = None  # 上一次检查成功的模块
+    # 上一次检查成功时所有可以引用的全局定义, 即导入的和模块中的定义, 检查失败时为 None.
+    scope: typing.Optional[typing.Dict[str, core.Var]] = None
+    # 全局定义直接引用的全局定义, 只在并行检查时使用.
+    uses: typing.Dict[
+        core.ID, typing.Tuple[core.Def[ast.Term], typing.List[core.Var]]
+    ] = dataclasses.field(default_factory=dict)
+
+    def __post_init__(self):
+        if self.loader is None:
+            self.loader = Loader(self.elaborator, self.store is not None, self.jobs)
+
+    def check(self, src: str, file: str = "") -> core.Defs[ast.Term]:
+        """检查源码中的所有定义, file 是源码所在的文件, 导入的模块从它所在的目录中查找. 不提供 file
+        时则从当前目录中查找, 并且不会生成接口文件. 先解析整个文件, 再对所有定义做作用域检查, 最后才
+        逐个类型检查, 所以源码中有多个错误时, 总是先报告语法错误, 然后是作用域错误."""
+        return list(self.stream(src, file, interleave=False))
+
+    def stream(
+        self, src: str, file: str = "", interleave: bool = True
+    ) -> typing.Iterator[core.Def[ast.Term]]:
+        """和 check 相同, 但每个定义都是解析, 作用域检查和类型检查完就立刻产出, 然后才开始解析下一个
+        定义, 所以不会同时保留所有定义的 cst, 出错之前也已经产出了排在它前面的定义. 并行检查需要先
+        知道所有定义之间的引用关系, 所以仍然是全部检查完之后才依次产出. interleave 为 False 时则和
+        check 一样, 每个阶段都处理完所有定义之后才进入下一个阶段."""
+        self.scope = None
+        p = parser.Parser(src, self.elaborator.session)
+        with self.phase("parse"):
+            imports = p.imports()
+            parsed = p.defs()
+            if not interleave:
+                parsed = iter(list(parsed))
+        resolver = resolve.Resolver()
+        scope: typing.Dict[str, core.Var] = {}  # 所有可以引用的全局定义
+        keys: typing.Dict[str, bytes] = {}  # 全局定义的键, 导入的定义的键就是模块的键
+        deps = []
+        with self.phase("import"):
+            self.loader.loading.add(os.path.normpath(file))  # 模块不能导入它自己
+            try:
+                for imp in imports:
+                    dep = self.loader.load(imp, os.path.dirname(file))
+                    deps.append(dep)
+                    for v in dep.exports.values():
+                        resolver.declare(imp.loc, v)
+                        scope[v.text] = v
+                        keys[v.text] = dep.key
+            finally:
+                self.loader.loading.discard(os.path.normpath(file))
+
+        self.rechecked = []
+        self.loaded = []
+        salt = budget_key(self.elaborator.budget)
+        ids = {v.id for v in scope.values()}
+        names: typing.List[core.Var] = []  # 这个模块中的所有定义
+        # 并行检查时的结果, 还没检查完的是 None.
+        ret: typing.List[typing.Optional[core.Def[ast.Term]]] = []
+        # 留给并行检查的定义, 以它在 ret 中的位置为键, 值是定义, 它的键和它引用的全局定义.
+        pending: typing.Dict[
+            int, typing.Tuple[core.Def[cst.Expr], bytes, typing.List[core.Var]]
+        ] = {}
+        defs = self.resolve(parsed, resolver)
+        if not interleave:
+            defs = iter(list(defs))
+        try:
+            for d, end in defs:
+                names.append(d.name)
+                scope[d.name.text] = d.name
+                ids.add(d.name.id)
+                with self.phase("elaborate"):
+                    used = sorted(refs(d, ids))
+                    # 定义的源码即从它的开头到它的结尾.
+                    h = hashlib.sha256(src[d.loc : end].encode() + salt).digest()
+                    key = hashlib.sha256(h + b"".join(keys[u] for u in used)).digest()
+                    keys[d.name.text] = key
+                    checked = self.elaborate(d, key, scope)
+                if self.jobs == 1:
+                    yield typing.cast(core.Def[ast.Term], checked)
+                    continue
+                if checked is None:
+                    pending[len(ret)] = (d, key, [scope[u] for u in used])
+                ret.append(checked)
+            if pending:
+                with self.phase("elaborate"):
+                    self.parallel(pending, ret)
+        except BaseException:
+            # 检查失败 (或者 stream 没有被读完) 时, 出错之后的定义都还没有检查到, 不能把它们的条目当作
+            # 过时的删掉, 所以只写入新的条目.
+            if self.store:
+                self.store.save()
+            raise
+        # 所有定义都检查完了, 这时不在 entries 中的条目才是真的过时了.
+        if self.store:
+            self.store.save(e.key for e in self.entries.values())
+        yield from typing.cast(core.Defs[ast.Term], ret)
+
+        # 删除已经不存在的定义.
+        exports = {v.text: v for v in names}
+        for name in [name for name in self.entries if name not in exports]:
+            del self.entries[name]
+            del self.elaborator.globals[self.ids[name]]
+
+        key = module_key(src, deps, salt)
+        self.module = Module(key, exports)
+        self.scope = scope
+        if file and self.store:
+            gs = [self.elaborator.globals[v.id] for v in names]
+            cache.write_interface(file, key, binary.encode_interface(gs))
+        if self.stats:
+            # 这几个计数器本来就一直在统计, 这里只是把它们记下来.
+            c = self.elaborator.normalizer.cache
+            self.stats.counters["global cache hits"] = c.hits
+            self.stats.counters["global cache misses"] = c.misses
+            self.stats.counters["nodes"] = self.elaborator.mk.count
+            if isinstance(self.elaborator.mk, ast.HashCons):
+                self.stats.counters["hashcons hits"] = self.elaborator.mk.hits
+            u = self.elaborator.unifier
+            self.stats.counters["unify pairs"] = u.pairs
+            self.stats.counters["unify identical"] = u.same
+
+    def resolve(
+        self,
+        defs: typing.Iterator[typing.Tuple[core.Def[cst.Expr], core.Loc]],
+        resolver: resolve.Resolver,
+    ) -> typing.Iterator[typing.Tuple[core.Def[cst.Expr], core.Loc]]:
+        """逐个解析 (即从 defs 中取出) 定义并检查它的作用域, 产出检查后的定义和它结束的位置."""
+        while True:
+            with self.phase("parse"):
+                d, end = next(defs, (None, 0))
+            if d is None:
+                return
+            d.name.id = self.ids.setdefault(d.name.text, d.name.id)
+            with self.phase("resolve"):
+                d = resolver.resolve_def(d)
+            yield d, end
+
+    def elaborate(
+        self, d: core.Def[cst.Expr], key: bytes, scope: typing.Dict[str, core.Var]
+    ) -> typing.Optional[core.Def[ast.Term]]:
+        """检查单个定义, 依次尝试上一次的检查结果, 磁盘缓存, 最后才重新检查. 并行检查时不在这里
+        重新检查, 而是返回 None, 留给 parallel."""
+        name = d.name.text
+        e = self.entries.get(name)
+        if e and e.key == key and e.d:
+            # 定义可能移动了位置.
+            return dataclasses.replace(e.d, loc=d.loc)
+        # 先删除旧的结果, 这样即使检查失败, 下一次也会重新检查它.
+        self.entries.pop(name, None)
+        self.elaborator.globals.pop(d.name.id, None)
+        checked = self.load(key, d, scope)
+        if checked:
+            self.loaded.append(name)
+        elif self.jobs > 1:
+            return None
+        else:
+            start = time.perf_counter()
+            checked = self.elaborator.elaborate_def(d)
+            self.rechecked.append(name)
+            if self.stats:
+                self.stats.defs[name] = time.perf_counter() - start
+            if self.store:
+                g = self.elaborator.globals[d.name.id]
+                self.store.put(key, binary.encode(g, checked))
+        self.entries[name] = Entry(key, checked if self.keep else None)
+        return checked
+
+    def phase(self, name: str) -> typing.ContextManager[None]:
+        """统计一个阶段的耗时, 不统计时什么都不做."""
+        return self.stats.phase(name) if self.stats else contextlib.nullcontext()
+
+    def close(self):
+        """关闭并行检查的工作进程."""
+        self.loader.close()
+
+    def parallel(
+        self,
+        pending: typing.Dict[
+            int, typing.Tuple[core.Def[cst.Expr], bytes, typing.List[core.Var]]
+        ],
+        ret: typing.List[typing.Optional[core.Def[ast.Term]]],
+    ):
+        """并行检查 pending 中的定义, 结果按原来的顺序填入 ret. 出错时和逐个检查一样, 报告源码中最靠前
+        的错误, 所以一个定义出错之后, 排在它前面的定义还会继续检查完."""
+        pool = self.loader.executor()
+        index = {d.name.id: i for i, (d, _, _) in pending.items()}
+        # 每个定义还在等待的定义, 以及等待它的定义.
+        waiting = {
+            i: {index[v.id] for v in deps if v.id in index}
+            for i, (_, _, deps) in pending.items()
+        }
+        dependents = collections.defaultdict(list)
+        for i, js in waiting.items():
+            for j in js:
+                dependents[j].append(i)
+        running: typing.Dict[futures.Future, int] = {}
+        errors: typing.Dict[int, core.Error] = {}
+        done = []
+
+        def submit(i: int):
+            d, _, deps = pending[i]
+            data = binary.encode_interface(self.closure(deps), keep_ids=True)
+            e = self.elaborator
+            hashcons = isinstance(e.mk, ast.HashCons)
+            args = (d, data, e.backend, e.jit, e.budget, hashcons)
+            running[pool.submit(_elaborate, *args)] = i
+
+        for i, js in waiting.items():
+            if not js:
+                submit(i)
+        while running:
+            finished, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+            for f in finished:
+                i = running.pop(f)
+                d, key, _ = pending[i]
+                try:
+                    data, elapsed = f.result()
+                except core.Error as e:
+                    errors[i] = e
+                    continue
+                except RecursionError:
+                    # 嵌套太深的 cst 在传给工作进程时就无法序列化了.
+                    msg = f"definition '{d.name.text}' is nested too deeply"
+                    errors[i] = Error(d.loc, msg)
+                    continue
+                g, checked = binary.decode(
+                    data,
+                    d,
+                    {},
+                    self.elaborator.mk,
+                    self.elaborator.session,
+                    keep_ids=True,
+                )
+                self.elaborator.globals[d.name.id] = g
+                if self.store:
+                    self.store.put(key, binary.encode(g, checked))
+                self.entries[d.name.text] = Entry(key, checked if self.keep else None)
+                if self.stats:
+                    self.stats.defs[d.name.text] = elapsed
+                ret[i] = checked
+                done.append(i)
+                for j in dependents[i]:
+                    waiting[j].discard(i)
+                    if not waiting[j] and not any(k < j for k in errors):
+                        submit(j)
+        self.rechecked = [pending[i][0].name.text for i in sorted(done)]
+        if errors:
+            raise errors[min(errors)]
+
+    def closure(self, vs: typing.List[core.Var]) -> core.Defs[ast.Term]:
+        """全局定义 vs 以及它们直接或间接引用的所有全局定义, 被引用的定义排在前面."""
+        ret = []
+        seen = set()
+        todo = [(v, False) for v in vs]
+        while todo:
+            v, visited = todo.pop()
+            if visited:
+                ret.append(self.elaborator.globals[v.id])
+                continue
+            if v.id in seen:
+                continue
+            seen.add(v.id)
+            todo.append((v, True))
+            todo.extend((u, False) for u in self.used(v) if u.id not in seen)
+        return ret
+
+    def used(self, v: core.Var) -> typing.List[core.Var]:
+        """全局定义 v 直接引用的全局定义."""
+        g = self.elaborator.globals[v.id]
+        cached = self.uses.get(v.id)
+        if cached and cached[0] is g:
+            return cached[1]
+        found = {}
+        todo = [p.type for p in g.params] + [g.ret, g.body]
+        while todo:
+            match todo.pop():
+                case ast.Ref(u):
+                    found[u.id] = u
+                case ast.FnType(p, b) | ast.Fn(p, b):
+                    todo.extend((p.type, b))
+                case ast.App(f, x):
+                    todo.extend((f, x))
+        self.uses[v.id] = (g, list(found.values()))
+        return self.uses[v.id][1]
+
+    def load(
+        self, key: bytes, d: core.Def[cst.Expr], scope: typing.Dict[str, core.Var]
+    ) -> typing.Optional[core.Def[ast.Term]]:
+        """从磁盘缓存中读取定义 d 的检查结果, 并把它加入到全局中. scope 是所有可以引用的全局定义."""
+        data = self.store and self.store.get(key)
+        if not data:
+            return None
+        try:
+            e = self.elaborator
+            g, checked = binary.decode(data, d, scope, e.mk, e.session)
+        except (binary.Error, UnicodeDecodeError):
+            return None  # 缓存损坏, 重新检查就好
+        self.elaborator.globals[d.name.id] = g
+        return checked
+
+
+@dataclasses.dataclass
+class Loader:
+    """模块加载器, 所有模块共用同一个类型检查器."""
+
+    elaborator: elab.Elaborator
+    use_cache: bool = True  # 是否使用磁盘缓存和接口文件
+    jobs: int = 1  # 并行检查的进程数, 所有模块共用同一个进程池
+    modules: typing.Dict[str, Module] = dataclasses.field(default_factory=dict)
+    # 正在加载的模块, 用于检查循环导入.
+    loading: typing.Set[str] = dataclasses.field(default_factory=set)
+    pool: typing.Optional[futures.ProcessPoolExecutor] = None
+
+    def executor(self) -> futures.ProcessPoolExecutor:
+        if self.pool is None:
+            self.pool = futures.ProcessPoolExecutor(self.jobs)
+        return self.pool
+
+    def close(self):
+        if self.pool:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def load(self, imp: cst.Import, dir: str) -> Module:
+        """加载 dir 目录中被 imp 导入的模块."""
+        name = imp.name.text
+        file = os.path.normpath(os.path.join(dir, name + ".lyzh"))
+        if file in self.loading:
+            raise Error(imp.loc, f"import cycle through module '{name}'")
+        try:
+            with open(file) as f:
+                src = f.read()
+        except OSError:
+            raise Error(imp.loc, f"module '{name}' not found")
+        self.loading.add(file)
+        try:
+            return self.module(file, src)
+        except core.Error as e:
+            # 错误的位置在被导入的文件中, 在这里报告它所在的文件, 并在导入的位置报错.
+            raise Error(imp.loc, f"{file}:{e.render(core.Lines.index(src))}")
+        finally:
+            self.loading.discard(file)
+
+    def module(self, file: str, src: str) -> Module:
+        """加载模块, 依次尝试已经加载过的模块, 接口文件, 最后才重新检查它."""
+        imports = parser.Parser(src, self.elaborator.session).imports()
+        deps = [self.load(imp, os.path.dirname(file)) for imp in imports]
+        key = module_key(src, deps, budget_key(self.elaborator.budget))
+        loaded = self.modules.get(file)
+        if loaded and loaded.key == key:
+            return loaded
+        loaded = self.interface(file, key, deps)
+        if not loaded:
+            store = cache.Store(cache.path_for(file)) if self.use_cache else None
+            d = Driver(self.elaborator, store, self, self.jobs)
+            d.check(src, file)
+            loaded = d.module
+        self.modules[file] = loaded
+        return loaded
+
+    def interface(
+        self, file: str, key: bytes, deps: typing.List[Module]
+    ) -> typing.Optional[Module]:
+        """读取模块的接口文件, 并把其中的定义加入到全局中."""
+        data = self.use_cache and cache.read_interface(file, key)
+        if not data:
+            return None
+        scope = {}
+        for dep in deps:
+            scope.update(dep.exports)
+        try:
+            e = self.elaborator
+            defs = binary.decode_interface(data, scope, e.mk, e.session)
+        except (binary.Error, UnicodeDecodeError):
+            return None
+        for d in defs:
+            self.elaborator.globals[d.name.id] = d
+        return Module(key, {d.name.text: d.name for d in defs})
+
+
+def _elaborate(
+    d: core.Def[cst.Expr],
+    data: bytes,
+    backend: str,
+    jit: bool,
+    budget: typing.Optional[normalize.Budget],
+    hashcons: bool,
+) -> typing.Tuple[bytes, float]:
+    """在工作进程中检查定义 d, data 是它需要的所有全局定义, 其余参数是类型检查器的选项. 同时返回检查
+    所花的时间."""
+    mk = ast.HashCons() if hashcons else ast.Builder()
+    e = elab.Elaborator(mk=mk, backend=backend, jit=jit, budget=budget)
+    for g in binary.decode_interface(data, {}, e.mk, e.session, keep_ids=True):
+        e.globals[g.name.id] = g
+    start = time.perf_counter()
+    checked = e.elaborate_def(d)
+    elapsed = time.perf_counter() - start
+    return binary.encode(e.globals[d.name.id], checked, keep_ids=True), elapsed
+
+
+def module_key(src: str, deps: typing.List[Module], salt: bytes = b"") -> bytes:
+    """模块的键, salt 见 budget_key."""
+    data = src.encode() + salt + b"".join(dep.key for dep in deps)
+    return hashlib.sha256(data).digest()
+
+
+def budget_key(budget: typing.Optional[normalize.Budget]) -> bytes:
+    """检查时使用的预算也是键的一部分, 混入定义和模块的源码中, 因为不限制预算时检查通过的定义在预算下
+    可能会失败. 没有预算时为空, 和不考虑预算时的键相同."""
+    if budget is None:
+        return b""
+    return repr(dataclasses.astuple(budget)).encode()
+
+
+def refs(d: core.Def[cst.Expr], ids: typing.Set[core.ID]) -> typing.Set[str]:
+    """找出定义 d 中引用的全局定义, ids 是所有全局定义的 ID."""
+    ret = set()
+    todo = [p.type for p in d.params] + [d.ret, d.body]
+    while todo:
+        match todo.pop():
+            case cst.Resolved(_, v):
+                if v.id in ids:
+                    ret.add(v.text)
+            case cst.Fn(_, _, body):
+                todo.append(body)
+            case cst.App(_, f, x):
+                todo.extend((f, x))
+            case cst.FnType(_, p, body):
+                todo.extend((p.type, body))
+    return ret
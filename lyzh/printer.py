@@ -0,0 +1,154 @@
+"""\
+# Printer
+
+把检查过的定义直接写到流 (标准输出或者文件) 中, 每个定义写完就可以丢掉, 不需要先拼出整个输出.
+
+文本格式和 core.Def 的 __str__ 完全相同, 另外可以把很大的值省略成 `...` (见 ast.pieces). JSON 格式则
+每行一个定义 (即 JSON Lines), 方便其他工具逐行读取. 其中的值是一张节点表, 子节点用它在表中的序号引用,
+同一个节点对象 (例如 HashCons 共享的子项) 只会出现一次, 所以输出的大小和共享后的节点数成正比, 而不是
+和展开成树之后的大小成正比:
+
+    {"name": "two", "params": [], "ret": 3, "body": 9, "nodes": [["ref", "nat"], ...]}
+
+节点是一个列表, 第一个元素是节点的种类:
+
+* ["idx", i, name], ["ref", name];
+* ["univ"], ["nat"], ["lit", n], ["prim", op], 其中字面量 n 是十进制数字的字符串, 因为它可以任意大;
+* ["fn_type", name, type, body], ["fn", name, type, body], ["app", f, x].
+
+JSON 格式不做省略.
+"""
+
+import dataclasses
+import json
+import typing
+
+import lyzh.abstract.data as ast
+import lyzh.core as core
+
+# 积攒多少个文本片段之后写一次, 逐个片段写出去的开销太大.
+_CHUNK = 4096
+
+
+@dataclasses.dataclass
+class Printer:
+    """定义的打印器, 依次调用 defn 打印每个定义, 最后调用 finish."""
+
+    out: typing.TextIO
+    max_depth: typing.Optional[int] = None  # 值最多打印几层, 更深的子项省略
+    max_size: typing.Optional[int] = None  # 每个值最多打印几个节点, 剩下的省略
+    json: bool = False  # 是否输出 JSON Lines
+    count: int = 0  # 已经打印的定义数量
+
+    def defn(self, d: core.Def[ast.Term]):
+        """打印一个定义."""
+        if self.json:
+            self.out.write(json.dumps(encode(d)) + "\n")
+        else:
+            self.write(self.text(d))
+        self.count += 1
+
+    def text(self, d: core.Def[ast.Term]) -> typing.Iterator[str]:
+        """定义的文本片段, 定义之间空一行."""
+        if self.count:
+            yield "\n\n"
+        yield f"fn {d.name}"
+        for i, p in enumerate(d.params):
+            yield f" ({p.name}: " if i else f"({p.name}: "
+            yield from self.term(p.type)
+            yield ")"
+        yield " -> "
+        yield from self.term(d.ret)
+        yield " {\n\t"
+        yield from self.term(d.body)
+        yield "\n}"
+
+    def term(self, tm: ast.Term) -> typing.Iterator[str]:
+        return ast.pieces(tm, self.max_depth, self.max_size)
+
+    def write(self, pieces: typing.Iterable[str]):
+        buf = []
+        for text in pieces:
+            buf.append(text)
+            if len(buf) >= _CHUNK:
+                self.out.write("".join(buf))
+                buf.clear()
+        self.out.write("".join(buf))
+
+    def error(self, file: str, lines: core.Lines, e: core.Error):
+        """打印一个带位置的错误."""
+        if self.json:
+            pos = lines.show(e.loc)
+            self.out.write(
+                json.dumps({"file": file, "pos": pos, "error": e.msg}) + "\n"
+            )
+        else:
+            self.out.write(f"{file}:{e.render(lines)}\n")
+
+    def finish(self):
+        """所有定义都打印完了, 文本格式以换行结尾 (没有定义时就是一个空行). 之后可以重新开始打印."""
+        if not self.json:
+            self.out.write("\n")
+        self.out.flush()
+        self.count = 0
+
+
+def encode(d: core.Def[ast.Term]) -> typing.Dict[str, typing.Any]:
+    """定义的 JSON 对象, 参数类型, 返回类型和函数体共用同一张节点表."""
+    nodes: typing.List[typing.List[typing.Any]] = []
+    # 已经放进表中的节点对象的 id 到序号的映射, 节点都被定义持有, 所以 id 不会被复用.
+    seen: typing.Dict[int, int] = {}
+
+    def node(tm: ast.Term) -> int:
+        """把 tm 和它的所有子节点放进表中, 返回它的序号. 子节点总是排在父节点的前面; 同样用 todo 栈
+        代替递归, 只有子节点都已经在表中时才放入父节点."""
+        root = tm
+        todo = [tm]
+        while todo:
+            tm = todo[-1]
+            if id(tm) in seen:
+                todo.pop()
+                continue
+            match tm:
+                case ast.Idx(i, v):
+                    entry = ["idx", i, v.text]
+                case ast.Ref(v):
+                    entry = ["ref", v.text]
+                case ast.Univ():
+                    entry = ["univ"]
+                case ast.Nat():
+                    entry = ["nat"]
+                case ast.Lit(n):
+                    entry = ["lit", core.show_nat(n)]
+                case ast.Prim(op):
+                    entry = ["prim", op]
+                case ast.FnType(p, b) | ast.Fn(p, b):
+                    missing = [x for x in (b, p.type) if id(x) not in seen]
+                    if missing:
+                        todo.extend(missing)
+                        continue
+                    kind = "fn_type" if isinstance(tm, ast.FnType) else "fn"
+                    entry = [kind, p.name.text, seen[id(p.type)], seen[id(b)]]
+                case ast.App(f, x):
+                    missing = [y for y in (x, f) if id(y) not in seen]
+                    if missing:
+                        todo.extend(missing)
+                        continue
+                    entry = ["app", seen[id(f)], seen[id(x)]]
+                case _:
+                    raise AssertionError("impossible")
+            todo.pop()
+            seen[id(tm)] = len(nodes)
+            nodes.append(entry)
+        return seen[id(root)]
+
+    params = [{"name": p.name.text, "type": node(p.type)} for p in d.params]
+    ret = node(d.ret)
+    body = node(d.body)
+    return {
+        "name": d.name.text,
+        "params": params,
+        "ret": ret,
+        "body": body,
+        "nodes": nodes,
+    }
@@ -0,0 +1,300 @@
+"""\
+# Server
+
+常驻的检查服务, 给编辑器之类需要频繁查询的工具使用. 每个文件都有自己的 Driver (见 lyzh.driver), 在多次
+请求之间一直保留, 所以解释器的启动, 模块的导入和已经检查过的定义 (包括它们在求值器中的缓存) 都只需要
+一次, 之后的检查只会重新检查发生了变化的定义.
+
+协议是 JSON-RPC 2.0, 每行一个消息, 通过标准输入输出或者一个 Unix socket 通信. 方法和参数:
+
+* check {file, src?}: 检查文件, src 是文件的内容, 不提供时从磁盘读取 (编辑器可以直接发送还没保存的
+  内容). 返回所有定义, 以及这次重新检查的和从缓存读取的定义的名字;
+* infer {file, expr}: 在文件的所有全局定义的上下文中推导表达式的类型;
+* normalize {file, expr}: 同上, 同时返回表达式的 normal form;
+* lookup {file, name}: 查找文件中可以引用的一个全局定义, 返回它的定义和类型;
+* shutdown: 结束服务.
+
+后三个方法使用文件上一次检查成功的结果, 还没有检查成功过时先从磁盘读取并检查一次. 打印值的方法都可以
+带上 max_depth 和 max_size 参数, 含义和 lyzh.printer 中的相同. 源码中的错误的错误码是 CHECK_ERROR,
+data 中是错误的位置 (行号和列号), 表达式中的错误的位置是相对于表达式的. 设置了预算 (见
+lyzh.abstract.normalize.Budget) 时, 超出预算也是 CHECK_ERROR, 服务可以继续处理之后的请求.
+"""
+
+import contextlib
+import dataclasses
+import io
+import json
+import os
+import socket
+import typing
+
+import lyzh.abstract.data as ast
+import lyzh.abstract.normalize as normalize
+import lyzh.abstract.value as val
+import lyzh.cache as cache
+import lyzh.concrete.elab as elab
+import lyzh.concrete.resolve as resolve
+import lyzh.core as core
+import lyzh.driver as driver
+import lyzh.printer as printer
+import lyzh.surface.parser as parser
+
+# JSON-RPC 规定的错误码.
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+# 检查的源码或者表达式中有错误.
+CHECK_ERROR = 1
+
+type Params = typing.Dict[str, typing.Any]
+
+
+class Error(Exception):
+    """返回给客户端的错误."""
+
+    def __init__(self, code: int, msg: str, data: typing.Any = None):
+        super().__init__(code, msg)
+        self.code = code
+        self.msg = msg
+        self.data = data
+
+
+@dataclasses.dataclass
+class Server:
+    """检查服务, 依次处理每个请求."""
+
+    backend: str = "nbe"  # 类型检查器的选项, 见 lyzh.concrete.elab.Elaborator
+    jit: bool = False
+    use_cache: bool = True  # 是否使用磁盘缓存和接口文件
+    jobs: int = 1  # 每个文件并行检查的进程数
+    budget: typing.Optional[normalize.Budget] = None  # 检查每个定义和表达式的资源预算
+    hashcons: bool = False  # 是否用 ast.HashCons 构造节点
+    drivers: typing.Dict[str, driver.Driver] = dataclasses.field(default_factory=dict)
+    running: bool = True  # 收到 shutdown 之后为 False
+    methods: typing.Dict[str, typing.Callable[[Params], typing.Any]] = (
+        dataclasses.field(init=False)
+    )
+
+    def __post_init__(self):
+        self.methods = {
+            "check": self.check,
+            "infer": self.infer,
+            "normalize": self.normalize,
+            "lookup": self.lookup,
+            "shutdown": self.shutdown,
+        }
+
+    def serve(self, inp: typing.TextIO, out: typing.TextIO):
+        """从 inp 逐行读取请求, 把响应写到 out 中, 直到 inp 结束或者收到 shutdown."""
+        for line in inp:
+            if not line.strip():
+                continue
+            ret = self.handle(line)
+            if ret is not None:
+                out.write(ret + "\n")
+                out.flush()
+            if not self.running:
+                break
+
+    def serve_socket(self, path: str):
+        """在 Unix socket path 上依次服务每个连接, 直到收到 shutdown."""
+        with socket.socket(socket.AF_UNIX) as s:
+            s.bind(path)
+            try:
+                s.listen()
+                while self.running:
+                    conn, _ = s.accept()
+                    with conn, conn.makefile("r") as inp, conn.makefile("w") as out:
+                        self.serve(inp, out)
+            finally:
+                os.unlink(path)
+
+    def close(self):
+        for d in self.drivers.values():
+            d.close()
+
+    def handle(self, line: str) -> typing.Optional[str]:
+        """处理一行请求, 返回一行响应. 通知 (即没有 id 的请求) 没有响应."""
+        try:
+            req = json.loads(line)
+        except json.JSONDecodeError as e:
+            return reply(None, error=Error(PARSE_ERROR, str(e)))
+        if not isinstance(req, dict) or not isinstance(req.get("method"), str):
+            return reply(None, error=Error(INVALID_REQUEST, "invalid request"))
+        id = req.get("id")
+        try:
+            f = self.methods.get(req["method"])
+            if f is None:
+                raise Error(METHOD_NOT_FOUND, f"method '{req['method']}' not found")
+            params = req.get("params", {})
+            if not isinstance(params, dict):
+                raise Error(INVALID_PARAMS, "params must be an object")
+            result = f(params)
+        except Error as e:
+            return None if id is None else reply(id, error=e)
+        except Exception as e:
+            # 检查器自身的错误 (例如非常深的值导致的 RecursionError) 不应该让服务退出.
+            err = Error(INTERNAL_ERROR, f"{type(e).__name__}: {e}")
+            return None if id is None else reply(id, error=err)
+        return None if id is None else reply(id, result)
+
+    def driver_for(self, file: str) -> driver.Driver:
+        """文件的 Driver, 第一次用到时新建."""
+        file = os.path.abspath(file)
+        d = self.drivers.get(file)
+        if d is None:
+            store = cache.Store(cache.path_for(file)) if self.use_cache else None
+            mk = ast.HashCons() if self.hashcons else ast.Builder()
+            e = elab.Elaborator(
+                mk=mk, backend=self.backend, jit=self.jit, budget=self.budget
+            )
+            d = driver.Driver(e, store=store, jobs=self.jobs)
+            self.drivers[file] = d
+        return d
+
+    def check(self, params: Params) -> typing.Any:
+        file = param(params, "file", str)
+        d, checked = self.run(file, param(params, "src", str, None))
+        return {
+            "defs": [show_def(x, params) for x in checked],
+            "rechecked": d.rechecked,
+            "loaded": d.loaded,
+        }
+
+    def run(
+        self, file: str, src: typing.Optional[str] = None
+    ) -> typing.Tuple[driver.Driver, core.Defs[ast.Term]]:
+        """检查文件, src 为 None 时从磁盘读取."""
+        if src is None:
+            try:
+                with open(file) as f:
+                    src = f.read()
+            except OSError as e:
+                raise Error(INVALID_PARAMS, str(e))
+        d = self.driver_for(file)
+        with source_errors(src):
+            return d, d.check(src, os.path.abspath(file))
+
+    def checked(
+        self, params: Params
+    ) -> typing.Tuple[driver.Driver, typing.Dict[str, core.Var]]:
+        """文件上一次检查成功的 Driver 和可以引用的全局定义, 还没有检查成功过时先检查."""
+        file = param(params, "file", str)
+        d = self.driver_for(file)
+        if d.scope is None:
+            self.run(file)
+        return d, typing.cast(typing.Dict[str, core.Var], d.scope)
+
+    def expr(
+        self,
+        params: Params,
+        f: typing.Callable[[elab.Elaborator, ast.Term, val.Value], typing.Any],
+    ) -> typing.Any:
+        """解析并推导参数中的表达式, 然后用类型检查器, 表达式和它的类型调用 f 得到结果. f 中的求值
+        和读回另外使用一份预算, 它的错误也一样是表达式中的错误."""
+        d, scope = self.checked(params)
+        src = param(params, "expr", str)
+        e = d.elaborator
+        with source_errors(src):
+            x = parser.expr(src, e.session)
+            x = resolve.Resolver(dict(scope)).resolve_top_expr(x)
+            tm, typ = e.elaborate_expr(x)
+            with e.budgeted(x.loc):
+                return f(e, tm, typ)
+
+    def infer(self, params: Params) -> typing.Any:
+        return self.expr(
+            params, lambda e, tm, typ: {"type": show(e.quote(typ), params)}
+        )
+
+    def normalize(self, params: Params) -> typing.Any:
+        return self.expr(
+            params,
+            lambda e, tm, typ: {
+                "term": show(e.nf(tm), params),
+                "type": show(e.quote(typ), params),
+            },
+        )
+
+    def lookup(self, params: Params) -> typing.Any:
+        d, scope = self.checked(params)
+        name = param(params, "name", str)
+        v = scope.get(name)
+        if v is None:
+            raise Error(INVALID_PARAMS, f"unknown definition '{name}'")
+        # 模块中的定义有检查的结果, 参数类型和返回类型都已经是 normal form, 直接拼成它的类型就行了;
+        # 导入的定义则只有保存在全局中的版本, 要先求值再读回.
+        entry = d.entries.get(name)
+        if entry and entry.d:
+            found, typ = entry.d, normalize.to_type(entry.d)
+        else:
+            # 导入的定义的位置在另一个文件中, 所以超出预算时不带位置.
+            e = d.elaborator
+            found = e.globals[v.id]
+            with source_errors(None), e.budgeted(found.loc, name):
+                typ = e.quote(e.normalizer.glob(v).type)
+        return {"def": show_def(found, params), "type": show(typ, params)}
+
+    def shutdown(self, params: Params) -> typing.Any:
+        self.running = False
+        return None
+
+
+def reply(
+    id: typing.Any, result: typing.Any = None, error: typing.Optional[Error] = None
+) -> str:
+    """一行 JSON-RPC 响应."""
+    msg: typing.Dict[str, typing.Any] = {"jsonrpc": "2.0", "id": id}
+    if error is None:
+        msg["result"] = result
+    else:
+        msg["error"] = {"code": error.code, "message": error.msg}
+        if error.data is not None:
+            msg["error"]["data"] = error.data
+    return json.dumps(msg)
+
+
+_MISSING = object()
+
+
+def param(
+    params: Params, name: str, typ: typing.Type, default: typing.Any = _MISSING
+) -> typing.Any:
+    """取出参数 name, 检查它的类型, 没有提供时使用 default, 没有 default 则报错."""
+    v = params.get(name, default)
+    if v is _MISSING:
+        raise Error(INVALID_PARAMS, f"missing parameter '{name}'")
+    if v is not default and not isinstance(v, typ):
+        raise Error(INVALID_PARAMS, f"parameter '{name}' must be {typ.__name__}")
+    return v
+
+
+@contextlib.contextmanager
+def source_errors(src: typing.Optional[str]):
+    """把源码 src 中的错误转换成 CHECK_ERROR, 带上错误的位置, 不知道源码时则不带位置."""
+    try:
+        yield
+    except core.Error as e:
+        if src is None:
+            raise Error(CHECK_ERROR, e.msg)
+        pos = core.Lines.index(src).show(e.loc)
+        raise Error(CHECK_ERROR, e.msg, {"pos": pos})
+
+
+def show(tm: ast.Term, params: Params) -> str:
+    """按参数中的 max_depth 和 max_size 打印值."""
+    depth, size = options(params)
+    return "".join(ast.pieces(tm, depth, size))
+
+
+def show_def(d: core.Def[ast.Term], params: Params) -> str:
+    """按参数中的 max_depth 和 max_size 打印定义."""
+    out = io.StringIO()
+    printer.Printer(out, *options(params)).defn(d)
+    return out.getvalue()
+
+
+def options(params: Params) -> typing.Tuple[typing.Optional[int], typing.Optional[int]]:
+    return param(params, "max_depth", int, None), param(params, "max_size", int, None)
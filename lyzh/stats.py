@@ -0,0 +1,92 @@
+"""\
+# Stats
+
+检查过程的统计信息: 每个阶段的耗时, 每个定义的类型检查耗时, 以及几个热点操作的调用次数.
+
+调用次数的统计是在 Stats.counting 期间把一个类型检查器的求值器, 相等检查器和会话 (见 core.Session)
+上的这些方法替换成计数的版本, 结束后再换回原来的方法, 所以不开启统计时没有任何额外的开销. 替换只对这几个
+对象生效, 同一个进程中的其他类型检查器 (例如其他线程中的会话) 不受影响. 注意并行检查时工作进程中的调用
+不会被统计.
+"""
+
+import collections
+import contextlib
+import dataclasses
+import functools
+import json
+import time
+import typing
+
+import lyzh.concrete.elab as elab
+
+# 统计调用次数的方法, 即类型检查器中的对象 (它的属性名) 上的哪些方法. 其中 inst 是把参数代入闭包, 相当于
+# 替换 (substitution), 而 fresh 是分配新的变量 ID.
+_COUNTED: typing.Dict[str, typing.Tuple[str, ...]] = {
+    "normalizer": ("eval", "apply", "inst", "quote"),
+    "unifier": ("unify",),
+    "session": ("fresh",),
+}
+
+
+@dataclasses.dataclass
+class Stats:
+    """统计信息."""
+
+    phases: typing.Dict[str, float] = dataclasses.field(default_factory=dict)
+    defs: typing.Dict[str, float] = dataclasses.field(default_factory=dict)
+    counters: typing.Counter[str] = dataclasses.field(
+        default_factory=collections.Counter
+    )
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """统计一个阶段的耗时, 同一个阶段多次进入时累加."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    @contextlib.contextmanager
+    def counting(self, e: elab.Elaborator):
+        """在这期间统计类型检查器 e 中热点操作的调用次数."""
+        objs = [
+            (getattr(e, attr), name) for attr, ns in _COUNTED.items() for name in ns
+        ]
+        for obj, name in objs:
+            # 实例上的属性会覆盖类中的方法, 对象内部通过 self 的调用也会经过它.
+            setattr(obj, name, self.counted(name, getattr(obj, name)))
+        try:
+            yield
+        finally:
+            for obj, name in objs:
+                delattr(obj, name)
+
+    def counted[**P, R](
+        self, name: str, f: typing.Callable[P, R]
+    ) -> typing.Callable[P, R]:
+        counters = self.counters
+
+        @functools.wraps(f)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            counters[name] += 1
+            return f(*args, **kwargs)
+
+        return wrapper
+
+    def table(self, top: int = 10) -> str:
+        """显示成表格, 定义只显示最慢的 top 个."""
+        lines = ["phase", *(f"  {k:<24}{v:>10.4f}s" for k, v in self.phases.items())]
+        slowest = sorted(self.defs.items(), key=lambda kv: kv[1], reverse=True)
+        lines.append(f"slowest definitions ({len(self.defs)} checked)")
+        lines.extend(f"  {k:<24}{v:>10.4f}s" for k, v in slowest[:top])
+        lines.append("counter")
+        lines.extend(f"  {k:<24}{v:>11}" for k, v in sorted(self.counters.items()))
+        return "\n".join(lines)
+
+    def json(self) -> str:
+        return json.dumps(
+            {"phases": self.phases, "defs": self.defs, "counters": self.counters},
+            indent=2,
+        )
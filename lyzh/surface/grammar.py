@@ -5,6 +5,10 @@
 
 EBNF 规则:
 
+    module = import* prog
+
+    import = 'import' ident
+
     prog = defn*
 
     defn = 'fn' ident param* '->' expr '{' expr '}'
@@ -15,12 +19,16 @@ EBNF 规则:
          | param '->' expr              # fn_type
          | 'type'                       # univ
          | primary_expr expr            # app
+         | prim                         # prim
          | ident                        # ref
          | '(' expr ')'                 # paren_expr
 
     primary_expr = ref
+                 | prim
                  | paren_expr
 
+    prim = 'Nat' | 'Add' | 'Mul' | digit+
+
 ## 什么是 surface、concrete、abstract 语法
 
 通常来说, 源代码解析之后的结果一般都是 AST (abstract syntax tree), 但在 lyzh 中,
@@ -38,6 +46,7 @@ import lyzh.concrete.data as cst
 import lyzh.core as core
 import lyzh.surface.parsec as parsec
 
+IMPORT = parsec.word("import")
 FN = parsec.word("fn")
 TYPE = parsec.word("type")
 LPAREN = parsec.word("(")
@@ -48,6 +57,37 @@ PIPE = parsec.word("|")
 LBRACE = parsec.word("{")
 RBRACE = parsec.word("}")
 
+# 内置的自然数类型和运算的关键词, 见 lyzh.abstract.data.PRIMS.
+PRIMS = ("Nat", "Add", "Mul")
+DIGITS = "0123456789"
+
+
+def module(m: cst.Module) -> parsec.Parser:
+    """解析一个文件的所有导入和定义到 m."""
+
+    def parse(s: parsec.Source) -> parsec.Source:
+        return parsec.seq(
+            parsec.soi,
+            parsec.many(import_(m.imports)),
+            parsec.many(defn(m.defs)),
+            parsec.eoi,
+        )(s)
+
+    return parse
+
+
+def import_(imports: typing.List[cst.Import]) -> parsec.Parser:
+    """解析一个导入, 成功则加入到 imports 中."""
+
+    def parse(s: parsec.Source) -> parsec.Source:
+        loc = s.cur()
+        name = core.Var()
+        s = parsec.seq(IMPORT, parsec.ident(name))(s)
+        imports.append(cst.Import(loc, name))
+        return s
+
+    return parse
+
 
 def prog(ds: core.Defs[cst.Expr]) -> parsec.Parser:
     """即 program, 解析一个文件的所有定义到 ds."""
@@ -112,11 +152,12 @@ class ExprParser:
                 self.fn_type(),
                 self.univ(),  # 必须在 ref 的前面, 不然会被解析成 ref
                 self.app(),  # 必须在 ref 的前面, 不然会被解析成 ref
+                self.prim(),  # 同样必须在 app 的后面
                 self.ref(),
                 self.paren_expr(),
             )(s)
 
-        return parse
+        return parsec.memo("expr", parse, self.get, self.set)
 
     def primary_expr(self) -> parsec.Parser:
         """简单表达式, 主要给 app 使用."""
@@ -124,10 +165,17 @@ class ExprParser:
         def parse(s: parsec.Source) -> parsec.Source:
             return parsec.choice(
                 self.ref(),
+                self.prim(),
                 self.paren_expr(),
             )(s)
 
-        return parse
+        return parsec.memo("primary_expr", parse, self.get, self.set)
+
+    def get(self) -> typing.Optional[cst.Expr]:
+        return self.e
+
+    def set(self, e: typing.Optional[cst.Expr]):
+        self.e = e
 
     def fn(self) -> parsec.Parser:
         """函数表达式, 即 lambda."""
@@ -190,6 +238,28 @@ class ExprParser:
 
         return parse
 
+    def prim(self) -> parsec.Parser:
+        """内置的自然数类型, 运算和字面量."""
+
+        def parse(s: parsec.Source) -> parsec.Source:
+            """prim"""
+            loc = s.cur()
+            c = s.peek()
+            if c and c in DIGITS:
+                while c and c in DIGITS:
+                    s = s.eat(c)
+                    c = s.peek()
+                self.e = cst.Lit(loc, core.read_nat(s.text(loc)))
+                return s
+            for w in PRIMS:
+                if s.src.startswith(w, loc):
+                    s = parsec.word(w)(s)
+                    self.e = cst.Nat(loc) if w == "Nat" else cst.Prim(loc, w)
+                    return s
+            raise parsec.Error(loc, "expected prim")
+
+        return parse
+
     def ref(self) -> parsec.Parser:
         """变量引用表达式."""
 
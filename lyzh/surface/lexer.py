@@ -0,0 +1,37 @@
+"""\
+# Lexer
+
+词法分析器, 用一个正则表达式一次性把源码切分成 token 序列, 供 lyzh.surface.parser 使用.
+"""
+
+import dataclasses
+import re
+import typing
+
+import lyzh.core as core
+
+# 标识符 (也包括关键词, 具体由解析器区分), 箭头, 以及其他任意非空白的单个字符.
+_TOKEN = re.compile(r"\w+|->|\S")
+
+
+@dataclasses.dataclass
+class Tokens:
+    """切分好的 token 序列, 最后一个总是代表文件结尾的空 token. 为了减少内存分配, token 的文本和位置
+    分别存放在两个列表中, 而不是为每个 token 创建一个对象."""
+
+    src: str
+    texts: typing.List[str]
+    pos: typing.List[core.Loc]  # 每个 token 在源码中的位置
+
+
+def tokenize(src: str) -> Tokens:
+    """切分源码."""
+    texts = []
+    pos = []
+    # 只扫描一遍源码, 同时取出每个 token 的文本和位置.
+    for m in _TOKEN.finditer(src):
+        texts.append(m.group())
+        pos.append(m.start())
+    texts.append("")
+    pos.append(len(src))
+    return Tokens(src, texts, pos)
@@ -6,13 +6,38 @@
 建议使用报错更友好的库和框架来替代, 这个文件可以跳过不看.
 """
 
+import collections
 import dataclasses
 import typing
 
 import lyzh.core as core
 
 
-class Error(Exception): ...
+class Error(core.Error): ...
+
+
+class Memo:
+    """Packrat 解析的备忘录, 记录每个规则在每个位置上的解析结果, 同一个规则在同一个位置只会真正解析一次.
+
+    为了限制内存, 最多只保留 limit 条记录, 超出时淘汰最久没有用到的记录. 通常回溯只会回到不远的位置,
+    所以被淘汰的记录很少会再被用到."""
+
+    def __init__(self, limit: int = 4096):
+        self.limit = limit
+        self.table: collections.OrderedDict[typing.Tuple[str, int], typing.Tuple] = (
+            collections.OrderedDict()
+        )
+
+    def get(self, key: typing.Tuple[str, int]) -> typing.Optional[typing.Tuple]:
+        ret = self.table.get(key)
+        if ret is not None:
+            self.table.move_to_end(key)
+        return ret
+
+    def put(self, key: typing.Tuple[str, int], entry: typing.Tuple):
+        self.table[key] = entry
+        if len(self.table) > self.limit:
+            self.table.popitem(last=False)
 
 
 @dataclasses.dataclass
@@ -20,32 +45,32 @@ class Source:
     """源码解析状态, 可以认为是个不严格的 monad."""
 
     src: str  # 源码文本
-    loc: core.Loc = dataclasses.field(default_factory=core.Loc)
+    loc: core.Loc = 0
     last_err: typing.Optional[Error] = None  # 上一个发生的错误, 另见 back 方法
+    memo: typing.Optional[Memo] = None  # 设置时开启 packrat 解析, 另见 memo 函数
+    # 分配标识符的 ID, 默认开始一个新的会话.
+    session: core.Session = dataclasses.field(default_factory=core.Session)
 
     def cur(self) -> core.Loc:
-        """当前位置, 注意这里创建了新的 Loc."""
-        return core.Loc(self.loc.pos, self.loc.ln, self.loc.col)
+        """当前位置."""
+        return self.loc
 
     def text(self, start: core.Loc) -> str:
         """返回起始位置到当前位置的文本."""
-        return self.src[start.pos : self.loc.pos]
+        return self.src[start : self.loc]
 
     def peek(self) -> typing.Optional[str]:
         """相当于 lookahead, 往前查看一个字符."""
-        if self.loc.pos >= len(self.src):
+        if self.loc >= len(self.src):
             return None
-        return self.src[self.loc.pos]
+        return self.src[self.loc]
 
     def next(self) -> typing.Optional[str]:
         """获得下一个字符, 如果成功, 则让解析状态往前."""
         c = self.peek()
         if not c:
             return None
-        if c == "\n":
-            self.loc.next_line()
-        else:
-            self.loc.next_column()
+        self.loc += 1
         return c
 
     def eat(self, c: str) -> typing.Self:
@@ -53,7 +78,7 @@ class Source:
         loc = self.cur()
         n = self.next()
         if n != c:
-            raise Error(f"{loc}: expected '{c}', got '{n}'")
+            raise Error(loc, f"expected '{c}', got '{n}'")
         return self
 
     def skip_spaces(self) -> typing.Self:
@@ -68,7 +93,7 @@ class Source:
     def back(self, loc: core.Loc, e: Error) -> typing.Self:
         """在遇到错误 e 时, 恢复到指定的位置, 通常是上一个开始解析的位置, 这里 e 存入到
         last_err 中, 如果遇到了致命的无法恢复的错误, 则可以抛出 last_err."""
-        self.loc = core.Loc(loc.pos, loc.ln, loc.col)
+        self.loc = loc
         self.last_err = e
         return self
 
@@ -79,17 +104,17 @@ type Parser = typing.Callable[[Source], Source]
 
 def soi(s: Source) -> Source:
     """期盼当前解析状态为起始状态."""
-    if s.loc.pos != 0:
-        raise Error(f"{s.loc}: expected start of input")
+    if s.loc != 0:
+        raise Error(s.loc, "expected start of input")
     return s
 
 
 def eoi(s: Source) -> Source:
     """期盼当前解析状态为结束状态."""
-    if s.loc.pos != len(s.src):
+    if s.loc != len(s.src):
         if s.last_err:  # 此时错误被认为是致命错误
             raise s.last_err
-        raise Error(f"{s.loc}: expected end of input")
+        raise Error(s.loc, "expected end of input")
     return s
 
 
@@ -102,7 +127,7 @@ def word(w: str) -> Parser:
                 s = s.eat(c)
             return s
         except Error:
-            raise Error(f"{s.loc}: expected '{w}'")
+            raise Error(s.loc, f"expected '{w}'")
 
     return parse
 
@@ -116,7 +141,7 @@ def ident(v: core.Var) -> Parser:
         # 第一个只能是小写字母.
         first = s.peek()
         if not first or not first.islower() or not first.isalpha():
-            raise Error(f"{s.loc}: expected identifier")
+            raise Error(s.loc, "expected identifier")
         s = s.eat(first)
 
         # 后续可以是小写字母, 数字, 下划线.
@@ -129,7 +154,7 @@ def ident(v: core.Var) -> Parser:
             s = s.eat(c)
 
         v.text = s.text(start)
-        v.id = core.fresh()
+        v.id = s.session.fresh()
         return s
 
     return parse
@@ -161,7 +186,7 @@ def choice(*parsers: Parser) -> Parser:
                 s = s.back(loc, e)
         # 所有解析方法都失败, 用 docstring 作为解析方法的规则名, 拼接错误信息抛出.
         msg = ", ".join([p.__doc__ for p in parsers])
-        raise Error(f"{s.loc}: expected {msg}")
+        raise Error(s.loc, f"expected {msg}")
 
     return parse
 
@@ -179,3 +204,39 @@ def many(p: Parser) -> Parser:
             s = s.skip_spaces()
 
     return parse
+
+
+def memo[T](
+    name: str,
+    p: Parser,
+    save: typing.Callable[[], T],
+    load: typing.Callable[[T], None],
+) -> Parser:
+    """Packrat 解析, 当 s.memo 存在时, 记住解析方法 p 在每个位置上的结果, 这样回溯之后再次解析同一个位置时,
+    直接使用记住的结果, 任何由 seq, choice 和 many 组成的语法都只需要线性时间.
+
+    name 是规则的名字, 同名的规则在同一个位置上的结果必须相同. 因为解析方法通过修改出参返回结果,
+    所以还需要 save 在解析成功后取出结果, 以及 load 在使用记住的结果时放回出参."""
+
+    def parse(s: Source) -> Source:
+        if not s.memo:
+            return p(s)
+        key = (name, s.loc)
+        entry = s.memo.get(key)
+        if entry:
+            match entry:
+                case (Error() as e,):
+                    raise e
+                case (loc, ret):
+                    s.loc = loc
+                    load(ret)
+                    return s
+        try:
+            s = p(s)
+        except Error as e:
+            s.memo.put(key, (e,))
+            raise
+        s.memo.put(key, (s.cur(), save()))
+        return s
+
+    return parse
@@ -0,0 +1,243 @@
+"""\
+# Recursive descent parser
+
+手写的递归下降解析器, 在 lyzh.surface.lexer 切分好的 token 序列上工作, 语法规则和
+lyzh.surface.grammar 中的 EBNF 完全一致, 产生相同的 cst 节点和相同的错误信息. 后者仍然保留,
+作为这里的参考实现.
+
+grammar 中的 choice 会依次尝试每个规则, 失败时回溯. 这里直接根据下一个 token 决定要走的规则:
+
+* '|' 只可能是 fn;
+* '(' ident ':' 只可能是 fn_type, 因为它们不可能是合法的 paren_expr;
+* 'type' 一定是 univ, 因为 univ 排在 app 和 ref 的前面;
+* 其余的 ident, prim 和 '(' 是 app 的开头 (即 primary_expr), 如果后面无法再解析出一个表达式,
+  则退回成 ref, prim 或 paren_expr 本身.
+
+唯一的不同是, 这里的关键词和数字必须是一个完整的单词, 例如 `typeof` 会被当成一个标识符, 而 grammar
+会把它解析成 `type` 后面跟着 `of`; `12ab` 则不是合法的 token, 而 grammar 会把它解析成 `12` 后面
+跟着 `ab`.
+
+表达式每嵌套一层, 解析时就要多递归一层, 嵌套太深 (例如上千层括号) 超出 Python 的递归深度时, 报告这个
+定义 (或表达式) 嵌套太深的错误.
+"""
+
+import typing
+
+import lyzh.concrete.data as cst
+import lyzh.core as core
+import lyzh.surface.lexer as lexer
+import lyzh.surface.parsec as parsec
+
+Error = parsec.Error
+
+# 表达式解析失败时的错误信息, 和 grammar 中 choice 拼出来的一致.
+_EXPR = "expected fn, fn_type, univ, app, prim, ref, paren_expr"
+
+# 内置的自然数类型和运算的关键词.
+_PRIMS = ("Nat", "Add", "Mul")
+
+
+class _Backtrack(Exception):
+    """表达式内部的解析失败, 由最外层的表达式转换成错误信息, 所以不需要携带任何信息."""
+
+
+class Parser:
+    """递归下降解析器."""
+
+    def __init__(self, src: str, session: typing.Optional[core.Session] = None):
+        self.tokens = lexer.tokenize(src)
+        # 分配标识符的 ID, 默认开始一个新的会话.
+        self.session = session or core.Session()
+        self.texts = self.tokens.texts
+        self.i = 0  # 当前 token 的位置
+
+    def module(self) -> cst.Module:
+        """module = import* prog"""
+        return cst.Module(self.imports(), self.prog())
+
+    def imports(self) -> typing.List[cst.Import]:
+        """import*, 即 module 开头的所有导入."""
+        imports = []
+        while self.texts[self.i] == "import":
+            # import = 'import' ident
+            loc = self.loc()
+            self.i += 1
+            imports.append(cst.Import(loc, self.ident()))
+        return imports
+
+    def prog(self) -> core.Defs[cst.Expr]:
+        """prog = defn*"""
+        return [d for d, _ in self.defs()]
+
+    def defs(self) -> typing.Iterator[typing.Tuple[core.Def[cst.Expr], core.Loc]]:
+        """逐个解析 prog 中的定义, 每解析完一个就产出它和它结束的位置, 即最后一个 token 之后."""
+        texts, pos = self.texts, self.tokens.pos
+        while texts[self.i]:
+            loc = self.loc()
+            try:
+                d = self.defn()
+            except RecursionError:
+                # 表达式每嵌套一层, 这里就要多递归一层.
+                raise Error(loc, "definition is nested too deeply")
+            yield d, pos[self.i - 1] + len(texts[self.i - 1])
+
+    def defn(self) -> core.Def[cst.Expr]:
+        """defn = 'fn' ident param* '->' expr '{' expr '}'"""
+        loc = self.loc()
+        self.word("fn")
+        name = self.ident()
+        ps = []
+        while self.texts[self.i] == "(":
+            start = self.i
+            try:
+                ps.append(self.param())
+            except (Error, _Backtrack):
+                self.i = start  # 和 grammar 中的 many 一样, 失败时回到这个参数的开头
+                break
+        self.word("->")
+        ret = self.top_expr()
+        self.word("{")
+        body = self.top_expr()
+        self.word("}")
+        return core.Def(loc, name, ps, ret, body)
+
+    def param(self) -> core.Param[cst.Expr]:
+        """param = '(' ident ':' expr ')'"""
+        self.word("(")
+        v = self.ident()
+        self.word(":")
+        typ = self.expr()
+        self.word(")")
+        return core.Param(v, typ)
+
+    def top_expr(self) -> cst.Expr:
+        """解析一个表达式, 失败时和 grammar 一样报告这个表达式的开头位置."""
+        loc = self.loc()
+        try:
+            return self.expr()
+        except (Error, _Backtrack):
+            raise Error(loc, _EXPR)
+
+    def expr(self) -> cst.Expr:
+        """解析表达式, 失败时抛出 _Backtrack 或 Error."""
+        start = self.i
+        text = self.texts[start]
+        match text:
+            case "|":
+                # fn = '|' ident '|' '{' expr '}'
+                self.i += 1
+                x = self.ident()
+                self.word("|")
+                self.word("{")
+                body = self.expr()
+                self.word("}")
+                return cst.Fn(self.loc(start), x, body)
+            case "(" if self.is_param():
+                # fn_type = param '->' expr
+                p = self.param()
+                self.word("->")
+                return cst.FnType(self.loc(start), p, self.expr())
+            case "(":
+                # paren_expr = '(' expr ')'
+                self.i += 1
+                f = self.expr()
+                self.word(")")
+            case "type":
+                self.i += 1
+                return cst.Univ(self.loc(start))
+            case _ if is_ident(text):
+                self.i += 1
+                f = cst.Unresolved(
+                    self.loc(start), core.Var(text, self.session.fresh())
+                )
+            case "Nat":
+                self.i += 1
+                f = cst.Nat(self.loc(start))
+            case "Add" | "Mul":
+                self.i += 1
+                f = cst.Prim(self.loc(start), text)
+            case _ if is_lit(text):
+                self.i += 1
+                f = cst.Lit(self.loc(start), core.read_nat(text))
+            case _:
+                raise _Backtrack()
+        # app = primary_expr expr, 如果失败则退回 primary_expr. 下一个 token 不可能是表达式的开头时,
+        # 直接退回, 不需要尝试.
+        cur = self.i
+        text = self.texts[cur]
+        if (
+            text not in ("|", "(", "type", *_PRIMS)
+            and not is_ident(text)
+            and not is_lit(text)
+        ):
+            return f
+        try:
+            return cst.App(self.loc(start), f, self.expr())
+        except (Error, _Backtrack):
+            self.i = cur
+            return f
+
+    def is_param(self) -> bool:
+        """当前是否是 '(' ident ':' 的形式."""
+        texts = self.texts[self.i + 1 : self.i + 3]
+        return len(texts) == 2 and is_ident(texts[0]) and texts[1] == ":"
+
+    def ident(self) -> core.Var:
+        """解析一个标识符."""
+        text = self.texts[self.i]
+        if not is_ident(text):
+            raise Error(self.loc(), "expected identifier")
+        self.i += 1
+        return core.Var(text, self.session.fresh())
+
+    def word(self, w: str):
+        """期盼下一个 token 是关键词 w."""
+        if self.texts[self.i] == w:
+            self.i += 1
+            return
+        # grammar 逐个字符匹配 w, 不匹配的那个字符也已经被读取了, 为了报错位置一致, 这里也跳过它.
+        src = self.tokens.src
+        pos = self.tokens.pos[self.i]
+        for c in w:
+            if pos >= len(src):
+                break
+            pos += 1
+            if src[pos - 1] != c:
+                break
+        raise Error(pos, f"expected '{w}'")
+
+    def loc(self, i: typing.Optional[int] = None) -> core.Loc:
+        """第 i 个 token 的位置, 默认是当前 token."""
+        return self.tokens.pos[self.i if i is None else i]
+
+
+def is_ident(text: str) -> bool:
+    """标识符的第一个字符只能是小写字母, 后续可以是小写字母, 数字, 下划线."""
+    return text[:1].islower() and text[0].isalpha()
+
+
+def is_lit(text: str) -> bool:
+    """自然数字面量只能由 ASCII 数字组成."""
+    return text.isascii() and text.isdigit()
+
+
+def module(src: str) -> cst.Module:
+    """解析一个文件的所有导入和定义."""
+    return Parser(src).module()
+
+
+def prog(src: str) -> core.Defs[cst.Expr]:
+    """解析一个文件的所有定义."""
+    return Parser(src).prog()
+
+
+def expr(src: str, session: typing.Optional[core.Session] = None) -> cst.Expr:
+    """解析单独的一个表达式, 例如交互式查询中的表达式."""
+    p = Parser(src, session)
+    try:
+        e = p.top_expr()
+    except RecursionError:
+        raise Error(0, "expression is nested too deeply")
+    if p.texts[p.i]:
+        raise Error(p.loc(), "expected end of input")
+    return e